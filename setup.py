@@ -15,7 +15,12 @@ setuptools.setup(
     url="https://github.com/OSINT-VDU-TNO/python-starter-service",
     include_package_data=True,
     install_requires=required,
-    packages=setuptools.find_packages(),
+    extras_require={
+        "msgspec": ["msgspec"],
+        "orjson": ["orjson"],
+        "test": ["pytest", "httpx"],
+    },
+    packages=setuptools.find_packages(exclude=["tests", "tests.*"]),
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -1,33 +1,161 @@
+from collections import namedtuple
+
+from starter_service.cache import memoize
+
+
+class Route(namedtuple("Route", ["consumer", "producer", "doc", "func", "method"])):
+    """Function registered as API endpoint and Kafka handler"""
+    __slots__ = ()
+
+    @property
+    def path(self):
+        return f"/api{f'/{self.consumer}' if self.consumer else ''}{f'/{self.producer}' if self.producer else ''}"
+
+    @property
+    def labels(self):
+        """Metric labels of the route"""
+        return ("topic", self.consumer), ("handler", self.func.__name__)
+
+    @property
+    def batch(self):
+        return getattr(self.func, "batch", False)
+
+    @property
+    def passthrough(self):
+        return getattr(self.func, "passthrough", False)
+
+    @property
+    def trust_output(self):
+        return getattr(self.func, "trust_output", False)
+
+    def describe(self):
+        """JSON description of the route"""
+        return {
+            "path": self.path,
+            "method": self.method,
+            "consumer": self.consumer,
+            "producer": self.producer,
+            "doc": self.doc,
+            "handler": self.func.__name__,
+            "batch": self.batch,
+            "cache": hasattr(self.func, "cache"),
+            "passthrough": self.passthrough,
+            "trust_output": self.trust_output,
+        }
+
+
 class API:
-    """API class to register functions to be exposed as API endpoints."""
+    """
+    API class to register functions to be exposed as API endpoints.
+
+    Functions registered with batch=True receive a list of messages and return a list of responses. On Kafka up to
+    batch_size messages (default BATCH_SIZE) are collected for at most batch_timeout_ms (default BATCH_TIMEOUT_MS).
+
+    Functions registered with cache=True are memoized by a canonical hash of the message, for at most cache_size
+    responses (default CACHE_MAX_SIZE) and cache_ttl_s seconds (default CACHE_TTL_S). The same cache serves the REST
+    route and the Kafka consumer, only pure functions of the message should be cached.
+
+    Functions registered with passthrough=True receive a RawMessage with the undecoded Kafka value. Returning it
+    forwards the original bytes to the producer topic when both topics use the same schema. Other handlers of the
+    consumer topic still receive decoded messages.
+
+    Functions registered with trust_output=True return responses that already match the producer schema. The REST
+    route serializes them as they are, without validating them against the response model.
+
+    Routes are indexed by consumer topic when the service starts (see freeze), lookups are plain dict hits after
+    that. Registering a route after that raises RuntimeError.
+    """
     functions = []
+    # Incremented whenever a route is registered
+    version = 0
+
+    # Set by freeze
+    _by_consumer = None
 
     @staticmethod
-    def post(consumer=None, producer=None, doc=None):
+    def post(consumer=None, producer=None, doc=None, batch=False, batch_size=None, batch_timeout_ms=None,
+             cache=False, cache_size=None, cache_ttl_s=None, passthrough=False, trust_output=False):
         def decorator(func):
-            func.consumer = consumer
-            func.producer = producer
-            func.doc = doc
-            API.functions.append((consumer, producer, doc, func, "POST"))
+            if cache:
+                func = API._memoize(func, batch, cache_size, cache_ttl_s)
+            func.passthrough = passthrough
+            func.trust_output = trust_output
+            API._register(func, consumer, producer, doc, "POST", batch, batch_size, batch_timeout_ms)
             return func
 
         return decorator
 
     @staticmethod
-    def get(consumer=None, producer=None, doc=None):
+    def get(consumer=None, producer=None, doc=None, batch=False, batch_size=None, batch_timeout_ms=None,
+            cache=False, cache_size=None, cache_ttl_s=None, passthrough=False, trust_output=False):
         def decorator(func):
-            func.consumer = consumer
-            func.producer = producer
-            func.doc = doc
-            API.functions.append((consumer, producer, doc, func, "GET"))
+            if cache:
+                func = API._memoize(func, batch, cache_size, cache_ttl_s)
+            func.passthrough = passthrough
+            func.trust_output = trust_output
+            API._register(func, consumer, producer, doc, "GET", batch, batch_size, batch_timeout_ms)
             return func
 
         return decorator
 
+    @staticmethod
+    def _memoize(func, batch, cache_size, cache_ttl_s):
+        if batch:
+            raise ValueError(f"Batch handler {func.__name__} can not be cached")
+        return memoize(func, max_size=cache_size, ttl=cache_ttl_s)
+
+    @staticmethod
+    def _register(func, consumer, producer, doc, method, batch, batch_size, batch_timeout_ms):
+        if API._by_consumer is not None:
+            raise RuntimeError(f"Can not register {func.__name__}, routes are frozen once the service started")
+        func.consumer = consumer
+        func.producer = producer
+        func.doc = doc
+        func.batch = batch
+        func.batch_size = batch_size
+        func.batch_timeout_ms = batch_timeout_ms
+        API.functions.append(Route(consumer, producer, doc, func, method))
+        API.version += 1
+
+    @staticmethod
+    def freeze():
+        """Index the routes by consumer topic, no routes can be registered afterwards. Returns the index"""
+        if API._by_consumer is not None:
+            return API._by_consumer
+        by_consumer = {}
+        for route in API.functions:
+            single, batch = by_consumer.setdefault(route.consumer, ([], []))
+            (batch if route.batch else single).append(route)
+        API._by_consumer = {consumer: (tuple(single), tuple(batch))
+                            for consumer, (single, batch) in by_consumer.items()}
+        return API._by_consumer
+
+    @staticmethod
+    def reset():
+        """Remove all routes and allow registering again, e.g. between tests"""
+        API.functions = []
+        API.version += 1
+        API._by_consumer = None
+
+    @staticmethod
+    def get_routes(consumer):
+        """Return (single, batch) routes for a consumer topic"""
+        index = API._by_consumer
+        if index is None:
+            index = API.freeze()
+        return index.get(consumer, ((), ()))
+
     @staticmethod
     def get_func_by_consumer(consumer):
-        func_list = []
-        for func in API.functions:
-            if func[0] == consumer:
-                func_list.append(func)
-        return func_list
+        single, batch = API.get_routes(consumer)
+        return single + batch
+
+    @staticmethod
+    def is_passthrough(consumer):
+        """True when a handler of the consumer topic receives raw messages"""
+        return any(route.passthrough for route in API.get_func_by_consumer(consumer))
+
+    @staticmethod
+    def get_passthrough_producers():
+        """Producer topics raw messages are forwarded to"""
+        return {route.producer for route in API.functions if route.passthrough and route.producer}
@@ -1,17 +1,59 @@
+import dataclasses
 import datetime
+import inspect
 import logging
+import socket
+import threading
+from time import perf_counter
+from typing import List
 
 import uvicorn
 from fastapi import FastAPI, APIRouter
 from fastapi.encoders import jsonable_encoder
-from pydantic import ValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
 from starlette.status import HTTP_200_OK
 from uvicorn import Config
 
 from starter_service.api import API
+from starter_service.avro_parser import is_struct, struct_encoder
+from starter_service.bulk import NDJSONResponse, caller, iter_json_items, process_items
 from starter_service.env import ENV
+from starter_service.jobs import JobQueueFull, JobStore
+from starter_service.metrics import Metrics
+from starter_service.raw_kafka import RawMessage, unwrap
+from starter_service.serialization import FastJSONResponse, dumps
 from starter_service.sub_process import SubProcess
+from starter_service.validator import MessageValidationError
+
+
+_BULK_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-ndjson": {"schema": {"type": "string", "description": "One message per line"}},
+            "application/json": {"schema": {"type": "array", "items": {"type": "object"}}},
+        },
+    }
+}
+
+
+# Placeholder for the live fields of the / document
+_LIVE_FIELDS = "__live__"
+
+
+class _Server(uvicorn.Server):
+    """uvicorn server that calls on_bound once its sockets are bound"""
+
+    def __init__(self, config, on_bound: callable):
+        super().__init__(config=config)
+        self.on_bound = on_bound
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if self.started:
+            self.on_bound()
 
 
 class APIServer(SubProcess):
@@ -32,6 +74,11 @@ class APIServer(SubProcess):
             # Change here to LOGGER
             return JSONResponse(status_code=400, content={"message": f"{base_error_message}. Detail: {err}"})
 
+        @self._fast_api.exception_handler(MessageValidationError)
+        async def message_validation_exception_handler(request, err):
+            base_error_message = f"Failed to execute: {request.method}: {request.url}"
+            return JSONResponse(status_code=400, content={"message": f"{base_error_message}. Detail: {err}"})
+
         @self._fast_api.exception_handler(ValidationError)
         async def validation_exception_handler(request, err):
             base_error_message = f"Failed to execute: {request.method}: {request.url}"
@@ -43,6 +90,10 @@ class APIServer(SubProcess):
         self._health = health
 
         self._uptime = None
+        # (key, head, tail) of the serialized / document, see _render_root
+        self._root_cache = None
+        self.bound = threading.Event()
+        self.startup_times = {}
 
     @property
     def fast_api(self):
@@ -56,38 +107,41 @@ class APIServer(SubProcess):
         self.logger.info("Registering static routes")
 
         @self._router.get("/")
-        def root():
+        async def root():
+            """Return the service status, only the Kafka status is computed per request"""
             from starter_service.schemas import SchemaRegistry
+            key = (SchemaRegistry.version, API.version, self._uptime)
+            cached = self._root_cache
+            if cached is None or cached[0] != key:
+                cached = self._root_cache = (key, *self._render_root())
             kafka_error = self._check_kafka_error()
-            return {
-                "client_id": ENV.CLIENT_ID,
-                "uptime": self._uptime,
-                "docs": "/docs",
-                "redoc": "/redoc",
-                "openapi": "/openapi.json",
-                "kafka": {
-                    "error": kafka_error,
-                    "status": "Connected" if kafka_error is None else "Error",
-                    "host": ENV.KAFKA_HOST,
-                    "schema_registry": ENV.SCHEMA_REGISTRY,
-                    "partitioner": ENV.PARTITIONER,
-                    "message_max_bytes": ENV.MESSAGE_MAX_BYTES,
-                    "heartbeat_interval": ENV.HEARTBEAT_INTERVAL,
-                    "offset_type": ENV.OFFSET_TYPE,
-                    "ignore_timeout": ENV.IGNORE_TIMEOUT,
-                    "use_latest": ENV.USE_LATEST,
-                    "max_poll_interval_ms": ENV.MAX_POLL_INTERVAL_MS,
-                    "session_timeout_ms": ENV.SESSION_TIMEOUT_MS,
-                    "topics": {
-                        "consume": ENV.CONSUME,
-                        "produce": ENV.PRODUCE
-                    }
-                },
-                "environment": {key: value for key, value in ENV.__dict__.items() if
-                                not key.startswith("_") and key not in ["SET", "GET", "update"]},
-                "schemas:": SchemaRegistry.get_schemas_dict(),
-                "methods": API.functions
-            }
+            live = dumps({"error": kafka_error, "status": "Connected" if kafka_error is None else "Error"})
+            # Splice the fields into the cached document, without their braces
+            return Response(content=cached[1] + live[1:-1] + cached[2], media_type="application/json")
+
+        @self._router.get("/metrics", tags=["status"])
+        def metrics():
+            """Return metrics in the Prometheus text format"""
+            return Response(content=Metrics.render(), media_type="text/plain; version=0.0.4")
+
+        @self._router.get("/api/workers", tags=["status"])
+        def workers():
+            """Return the status of every worker process when running with SERVICE_WORKERS"""
+            from starter_service.supervisor import Supervisor
+            status = Supervisor.status()
+            if status is None:
+                return Response(status_code=404)
+            return {"worker": Supervisor.worker_index, "workers": status}
+
+        if ENV.REST_JOBS_ENABLED:
+            @self._router.get("/api/jobs/{job_id}", tags=["jobs"])
+            def job(job_id: str):
+                """Return the status of a job submitted to a /jobs route, and its response once it is done"""
+                kafka = self.base_service.kafka if self.base_service else None
+                job = kafka.jobs.get(job_id) if kafka else None
+                if job is None:
+                    return JSONResponse(status_code=404, content={"message": f"Job {job_id} not found"})
+                return job
 
         @self._router.get("/api/health", tags=["status"])
         def health(verbose: bool = False):
@@ -110,6 +164,40 @@ class APIServer(SubProcess):
             else:
                 return Response(status_code=503)
 
+    def _render_root(self):
+        """Serialize the static part of the / document, returns the bytes before and after the Kafka status"""
+        from starter_service.schemas import SchemaRegistry
+        document = {
+            "client_id": ENV.CLIENT_ID,
+            "uptime": self._uptime,
+            "docs": "/docs",
+            "redoc": "/redoc",
+            "openapi": "/openapi.json",
+            "kafka": {
+                _LIVE_FIELDS: 0,
+                "host": ENV.KAFKA_HOST,
+                "schema_registry": ENV.SCHEMA_REGISTRY,
+                "partitioner": ENV.PARTITIONER,
+                "message_max_bytes": ENV.MESSAGE_MAX_BYTES,
+                "heartbeat_interval": ENV.HEARTBEAT_INTERVAL,
+                "offset_type": ENV.OFFSET_TYPE,
+                "ignore_timeout": ENV.IGNORE_TIMEOUT,
+                "use_latest": ENV.USE_LATEST,
+                "max_poll_interval_ms": ENV.MAX_POLL_INTERVAL_MS,
+                "session_timeout_ms": ENV.SESSION_TIMEOUT_MS,
+                "topics": {
+                    "consume": ENV.CONSUME,
+                    "produce": ENV.PRODUCE
+                }
+            },
+            "environment": {key: value for key, value in ENV.__dict__.items() if
+                            not key.startswith("_") and key not in ["SET", "GET", "update"]},
+            "schemas:": SchemaRegistry.get_schemas_dict(),
+            "methods": [route.describe() for route in API.functions]
+        }
+        head, tail = dumps(jsonable_encoder(document)).split(dumps({_LIVE_FIELDS: 0})[1:-1])
+        return head, tail
+
     def run(self):
         """Start the server"""
         self.logger.info("Starting API server")
@@ -124,17 +212,35 @@ class APIServer(SubProcess):
             self.callback()
         try:
             self.logger.info(f"Starting API server on {ENV.REST_API_HOST}:{ENV.REST_API_PORT}")
-            self.server = uvicorn.Server(config=Config(self._fast_api, host=ENV.REST_API_HOST, port=ENV.REST_API_PORT))
-            self.server.run()
+            self.server = _Server(Config(self._fast_api, host=ENV.REST_API_HOST, port=ENV.REST_API_PORT), self._on_bound)
+            if ENV.REST_API_REUSE_PORT:
+                # Processes of the same service share the port, the kernel spreads connections across them
+                self.server.run(sockets=[self._bind_reuse_port()])
+            else:
+                self.server.run()
         except Exception as e:
             self.logger.error(f"Failed to start API server: {e}")
             self.stop()
 
+    def _on_bound(self):
+        self.startup_times["api"] = perf_counter()
+        self.bound.set()
+
     def stop(self):
         self.logger.info("Stopping API server")
         self.running = False
         self.server.should_exit = True
 
+    @staticmethod
+    def _bind_reuse_port():
+        family = socket.AF_INET6 if ":" in ENV.REST_API_HOST else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((ENV.REST_API_HOST, ENV.REST_API_PORT))
+        sock.set_inheritable(True)
+        return sock
+
     def _validated(self):
         """Validate that the server is configured correctly"""
         if ENV.REST_API_ENABLED is False:
@@ -143,23 +249,123 @@ class APIServer(SubProcess):
     def _register_dynamic_routes(self):
         """Register routes that are dynamically added by the user"""
         self.logger.info("Registering dynamic routes")
-        for consumer, producer, doc, func, _type in API.functions:
-            self._register_route(consumer, producer, doc, func, _type)
+        for route in API.functions:
+            self._register_route(route)
 
-    def _register_route(self, consumer, producer, doc, func, _type):
+    def _register_route(self, route):
         """Register a route"""
+        consumer, producer, doc, func, _type = route
         from starter_service.schemas import SchemaRegistry
         consumer_class = SchemaRegistry.get_schema(consumer)
         producer_class = SchemaRegistry.get_schema(producer)
 
         self.logger.info(f"Registering route {consumer}:{consumer_class} -> {producer}:{producer_class} ({doc})")
-        func_wrapper = lambda message: func(self.base_service, message) \
-            if isinstance(message, str) else func(self.base_service, jsonable_encoder(message))
-        path = f"/api{f'/{consumer}' if consumer else ''}{f'/{producer}' if producer else ''}"
+        validate = SchemaRegistry.get_validator(consumer) if ENV.FAST_VALIDATION else None
+        if validate:
+            # Request bodies are checked as dicts against the AVRO schema and passed on without a pydantic round trip
+            consumer_class = dict
+            encode = validate
+        elif is_struct(consumer_class):
+            # FastAPI can not use msgspec Structs, request bodies are converted to the Struct with msgspec instead
+            encode = struct_encoder(consumer_class)
+            consumer_class = dict
+        else:
+            encode = lambda message: message if isinstance(message, str) else jsonable_encoder(message)
+        if route.passthrough:
+            # Same interface as on Kafka, but there are no original bytes to forward
+            encode_raw = encode
+            encode = lambda message: RawMessage(decoded=encode_raw(message), topic=consumer)
+            func = self._unwrapped(func)
+        if ENV.REST_BULK_ENABLED:
+            self._register_bulk_route(route, func, self._bulk_parser(consumer_class, validate, encode))
+        struct_output = is_struct(producer_class)
+        if route.batch:
+            consumer_class, producer_class = List[consumer_class], List[producer_class]
+            encode_one = encode
+            encode = lambda message: [encode_one(m) for m in message]
+        if struct_output:
+            # Not usable as response model either, responses are serialized as they are
+            respond = FastJSONResponse
+            response_model, responses = None, None
+        elif route.trust_output or ENV.REST_TRUST_OUTPUT:
+            # Responses are serialized as they are, producer_class only documents them
+            respond = FastJSONResponse
+            response_model, responses = None, {200: {"model": producer_class}} if producer_class else None
+        else:
+            respond = None
+            response_model, responses = producer_class, None
+        if inspect.iscoroutinefunction(func):
+            # Awaited on the event loop instead of FastAPI's threadpool
+            async def func_wrapper(message):
+                response = await func(self.base_service, encode(message))
+                return respond(response) if respond else response
+        else:
+            def func_wrapper(message):
+                response = func(self.base_service, encode(message))
+                return respond(response) if respond else response
 
-        func_wrapper.__annotations__ = {'message': consumer_class, 'return': producer_class}
-        self._router.add_api_route(path, func_wrapper, methods=[_type], response_model=producer_class, tags=["topics"],
+        func_wrapper.__annotations__ = {'message': consumer_class}
+        self._router.add_api_route(route.path, func_wrapper, methods=[_type], response_model=response_model,
+                                   response_class=FastJSONResponse, responses=responses, tags=["topics"],
                                    summary=doc)
+        if ENV.REST_JOBS_ENABLED:
+            self._register_job_route(route, consumer_class, encode)
+
+    def _register_job_route(self, route, consumer_class, encode):
+        """Register {path}/jobs, which queues the message on the Kafka worker pipeline and returns a job id"""
+        async def submit(message):
+            kafka = self.base_service.kafka if self.base_service else None
+            if not kafka:
+                return JSONResponse(status_code=503, content={"message": "Kafka not initialized"})
+            try:
+                job_id = kafka.submit_job(route, encode(message))
+            except JobQueueFull as e:
+                return JSONResponse(status_code=503, content={"message": f"Job queue is full, {e}"},
+                                    headers={"Retry-After": "1"})
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status": JobStore.QUEUED,
+                "url": f"/api/jobs/{job_id}"
+            })
+
+        submit.__annotations__ = {'message': consumer_class}
+        self._router.add_api_route(f"{route.path}/jobs", submit, methods=["POST"], status_code=202, tags=["jobs"],
+                                   summary=f"{route.doc or route.path} (job)")
+
+    def _register_bulk_route(self, route, func, parse):
+        """Register {path}/bulk, which streams one NDJSON result line per item of a NDJSON or JSON array body"""
+        batch_size = (route.func.batch_size or ENV.BATCH_SIZE) if route.batch else None
+        parse_unit = (lambda items: [parse(item) for item in items]) if batch_size else parse
+        call = caller(func, lambda: self.base_service, parse_unit, inspect.iscoroutinefunction(func))
+
+        async def bulk(request: Request, parallel: int = 1):
+            parallel = max(1, min(parallel, ENV.REST_BULK_MAX_PARALLEL))
+            items = iter_json_items(request.stream(), ENV.MESSAGE_MAX_BYTES)
+            return NDJSONResponse(process_items(items, call, parallel, batch_size))
+
+        self._router.add_api_route(f"{route.path}/bulk", bulk, methods=[route.method], tags=["bulk"],
+                                   summary=f"{route.doc or route.path} (bulk)", openapi_extra=_BULK_OPENAPI)
+
+    @staticmethod
+    def _bulk_parser(consumer_class, validate, encode):
+        """Validate one item of a bulk request like the request body of the single message route"""
+        if validate or not (isinstance(consumer_class, type) and issubclass(consumer_class, BaseModel)):
+            if not dataclasses.is_dataclass(consumer_class):
+                return encode
+            adapter = TypeAdapter(consumer_class)
+            return lambda item: encode(adapter.validate_python(item))
+        return lambda item: encode(consumer_class.model_validate(item))
+
+    @staticmethod
+    def _unwrapped(func):
+        """Wrap a passthrough handler, so RawMessage responses are returned as decoded messages"""
+        if inspect.iscoroutinefunction(func):
+            async def wrapper(service, message):
+                return unwrap(await func(service, message))
+        else:
+            def wrapper(service, message):
+                return unwrap(func(service, message))
+        return wrapper
 
     def _check_kafka_error(self):
         """Check if there is a kafka error"""
@@ -1,5 +1,17 @@
+import dataclasses
 import json
-from typing import Optional, Union
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Dict, List, Optional, Union
+from uuid import UUID
+
+from pydantic import BaseModel, create_model
+
+from starter_service.validator import MessageValidationError
+
+# Kinds of classes generated from AVRO schemas: pydantic models, dataclasses with __slots__ or msgspec Structs
+TARGETS = ("pydantic", "dataclass", "msgspec")
 
 _reserved_keywords = ["def", "class", "from", "to", "import", "as", "pass", "return", "raise", "try", "except",
                       "finally", "while", "for", "in", "continue", "break", "if", "elif", "else", "assert", "del",
@@ -9,6 +21,13 @@ _reserved_keywords = ["def", "class", "from", "to", "import", "as", "pass", "ret
 
 def avsc_to_pydantic(schema: dict) -> [str, str]:
     """Generate python code of pydantic of given Avro Schema"""
+    return avsc_to_code(schema, "pydantic")
+
+
+def avsc_to_code(schema: dict, target: str = "pydantic") -> [str, str]:
+    """Generate python code of pydantic models, __slots__ dataclasses or msgspec Structs of given Avro Schema"""
+    if target not in TARGETS:
+        raise ValueError(f"Unsupported target {target}, use one of {TARGETS}")
     if "type" not in schema or schema["type"] != "record":
         raise AttributeError("Type not supported")
     if "name" not in schema:
@@ -74,7 +93,7 @@ def avsc_to_pydantic(schema: dict) -> [str, str]:
             sub_type = get_python_type(t.get("items"))
             py_type = f"List[{sub_type}]"
         elif t.get("type") == "record":
-            record_type_to_pydantic(t)
+            record_type_to_code(t)
             py_type = t.get("name")
         elif t.get("type") == "map":
             value_type = get_python_type(t.get("values"))
@@ -94,10 +113,15 @@ def avsc_to_pydantic(schema: dict) -> [str, str]:
         else:
             return py_type
 
-    def record_type_to_pydantic(schema: dict):
-        """Convert a single avro record type to a pydantic class"""
+    def record_type_to_code(schema: dict):
+        """Convert a single avro record type to a class of the target"""
         name = schema["name"]
-        current = f"class {name}(BaseModel):\n"
+        if target == "dataclass":
+            current = f"@dataclass(slots=True, kw_only=True)\nclass {name}:\n"
+        elif target == "msgspec":
+            current = f"class {name}(msgspec.Struct, kw_only=True):\n"
+        else:
+            current = f"class {name}(BaseModel):\n"
 
         for field in schema["fields"]:
             n = field["name"]
@@ -105,7 +129,9 @@ def avsc_to_pydantic(schema: dict) -> [str, str]:
             default = field.get("default")
             if n in _reserved_keywords:
                 n = f"{n}_"
-            if "default" not in field:
+            if target != "pydantic":
+                current += f"    {n}: {t}{_compact_default(target, field)}\n"
+            elif "default" not in field:
                 current += f"    {n}: {t}\n"
             elif isinstance(default, (bool, type(None))):
                 current += f"    {n}: {t} = {default}\n"
@@ -116,7 +142,11 @@ def avsc_to_pydantic(schema: dict) -> [str, str]:
 
         classes[name] = current
 
-    record_type_to_pydantic(schema)
+    record_type_to_code(schema)
+    if target != "pydantic":
+        file_content = _COMPACT_HEADERS[target] + "\n\n".join(classes.values()) + _COMPACT_METHODS[target]
+        file_content += f"\n\nmain_class = {main_class}\n"
+        return file_content, main_class
 
     file_content = """
 import json
@@ -143,6 +173,209 @@ from pydantic import BaseModel
     return file_content, main_class
 
 
+_COMPACT_IMPORTS = """
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import List, Optional, Dict, Union
+from uuid import UUID
+"""
+_COMPACT_HEADERS = {
+    "dataclass": _COMPACT_IMPORTS + "from dataclasses import asdict, dataclass, field\n\n",
+    "msgspec": _COMPACT_IMPORTS + "\nimport msgspec\n\n",
+}
+# Appended to the main class, which is generated last
+_COMPACT_METHODS = {
+    "dataclass": """
+    def dict(self, *args, **kwargs):
+        return {k[:-1] if k.endswith("_") else k: v for k, v in asdict(self).items()}
+
+    def json(self, *args, **kwargs):
+        return json.dumps(self.dict(), *args, **kwargs)
+""",
+    "msgspec": """
+    def dict(self, *args, **kwargs):
+        return msgspec.to_builtins(self)
+
+    def json(self, *args, **kwargs):
+        return json.dumps(self.dict(), *args, **kwargs)
+""",
+}
+
+
+def _compact_default(target, field):
+    """Code of the default and field options of a dataclass or msgspec field, empty when there is none"""
+    name = field["name"] if target == "msgspec" and field["name"] in _reserved_keywords else None
+    prefix = "field" if target == "dataclass" else "msgspec.field"
+    if "default" not in field:
+        return f" = {prefix}(name={name!r})" if name else ""
+    default = field["default"]
+    if isinstance(default, (list, dict)):
+        # Mutable defaults are created per instance
+        options = f"default_factory=lambda: {default!r}"
+    elif name:
+        options = f"default={default!r}"
+    else:
+        return f" = {default!r}"
+    return f" = {prefix}({options}{f', name={name!r}' if name else ''})"
+
+
+class _MainModel(BaseModel):
+    """Base of the main model built by avsc_to_model, same as the dict and json methods of generated code"""
+
+    def dict(self, *args, **kwargs):
+        return {
+            k[:-1] if k.endswith("_") else k: v for k, v in self.__dict__.items()
+        }
+
+    def json(self, *args, **kwargs):
+        return json.dumps(self.dict(), *args, **kwargs)
+
+
+def _dataclass_dict(self, *args, **kwargs):
+    return {k[:-1] if k.endswith("_") else k: v for k, v in dataclasses.asdict(self).items()}
+
+
+def _struct_dict(self, *args, **kwargs):
+    import msgspec
+    return msgspec.to_builtins(self)
+
+
+def _compact_json(self, *args, **kwargs):
+    return json.dumps(self.dict(), *args, **kwargs)
+
+
+def is_struct(cls) -> bool:
+    """True for msgspec Structs, which FastAPI can not use as request or response models"""
+    return any(base.__module__.startswith("msgspec") for base in getattr(cls, "__mro__", ())[1:])
+
+
+def struct_encoder(cls):
+    """Function that validates a message against a msgspec Struct and returns it as a dict"""
+    import msgspec
+
+    def encode(message):
+        try:
+            return msgspec.to_builtins(msgspec.convert(message, cls))
+        except msgspec.ValidationError as e:
+            raise MessageValidationError(str(e))
+    return encode
+
+
+def avsc_to_model(schema: dict, target: str = "pydantic") -> type:
+    """Build pydantic models, __slots__ dataclasses or msgspec Structs of given Avro Schema directly, without
+    generating python code"""
+    if target not in TARGETS:
+        raise ValueError(f"Unsupported target {target}, use one of {TARGETS}")
+    if target == "msgspec":
+        import msgspec
+    if "type" not in schema or schema["type"] != "record":
+        raise AttributeError("Type not supported")
+    if "name" not in schema:
+        raise AttributeError("Name is required")
+    if "fields" not in schema:
+        raise AttributeError("fields are required")
+
+    classes = {}
+    primitives = {"string": str, "long": int, "int": int, "boolean": bool, "double": float, "float": float,
+                  "null": type(None), "None": type(None)}
+    logical_types = {"uuid": UUID, "decimal": Decimal, "timestamp-millis": datetime, "timestamp-micros": datetime,
+                     "time-millis": time, "time-micros": time, "date": date}
+
+    def get_python_type(t: Union[str, dict]) -> type:
+        """Returns python type for given avro type"""
+        optional = False
+        union = False
+        if isinstance(t, str):
+            if t in primitives:
+                py_type = primitives[t]
+            elif t in classes:
+                py_type = classes[t]
+            else:
+                raise NotImplementedError(f"Type {t} not supported yet")
+        elif isinstance(t, list):
+            if "null" in t or "None" in t or None in t:
+                optional = True
+            if len(t) > 2 or (not optional and len(t) > 1):
+                union = True
+                py_type = [get_python_type(i) for i in t]
+            else:
+                c = t.copy()
+                if "null" in c:
+                    c.remove("null")
+                py_type = get_python_type(c[0])
+        elif t.get("logicalType") in logical_types:
+            py_type = logical_types[t.get("logicalType")]
+        elif t.get("type") == "enum":
+            enum_name = t.get("name")
+            if enum_name not in classes:
+                classes[enum_name] = Enum(enum_name, {s: s for s in t.get("symbols")}, type=str)
+            py_type = classes[enum_name]
+        elif t.get("type") == "string":
+            py_type = str
+        elif t.get("type") == "array":
+            py_type = List[get_python_type(t.get("items"))]
+        elif t.get("type") == "record":
+            record_type_to_model(t)
+            py_type = classes[t.get("name")]
+        elif t.get("type") == "map":
+            py_type = Dict[str, get_python_type(t.get("values"))]
+        else:
+            raise NotImplementedError(f"Type {t} not supported yet")
+        if optional:
+            return Optional[Union[tuple(py_type)]] if isinstance(py_type, list) else Optional[py_type]
+        elif union:
+            return Union[tuple(py_type)]
+        else:
+            return py_type
+
+    def record_type_to_model(schema: dict, base=BaseModel):
+        """Convert a single avro record type to a model of the target"""
+        if target != "pydantic":
+            return record_type_to_compact(schema, base is _MainModel)
+        fields = {}
+        for field in schema["fields"]:
+            n = field["name"]
+            t = get_python_type(field["type"])
+            if n in _reserved_keywords:
+                n = f"{n}_"
+            fields[n] = (t, field["default"]) if "default" in field else (t, ...)
+        classes[schema["name"]] = create_model(schema["name"], __base__=base, **fields)
+
+    def record_type_to_compact(schema: dict, main: bool):
+        """Convert a single avro record type to a __slots__ dataclass or msgspec Struct"""
+        make_field = dataclasses.field if target == "dataclass" else msgspec.field
+        fields = []
+        for field in schema["fields"]:
+            n = field["name"]
+            t = get_python_type(field["type"])
+            options = {}
+            if "default" in field:
+                default = field["default"]
+                if isinstance(default, (list, dict)):
+                    # Mutable defaults are created per instance
+                    options["default_factory"] = lambda default=default: json.loads(json.dumps(default))
+                else:
+                    options["default"] = default
+            if n in _reserved_keywords:
+                if target == "msgspec":
+                    # Encoded with the name of the schema
+                    options["name"] = n
+                n = f"{n}_"
+            fields.append((n, t, make_field(**options)) if options else (n, t))
+        if target == "dataclass":
+            namespace = {"dict": _dataclass_dict, "json": _compact_json} if main else None
+            model = dataclasses.make_dataclass(schema["name"], fields, namespace=namespace, slots=True, kw_only=True)
+        else:
+            namespace = {"dict": _struct_dict, "json": _compact_json} if main else None
+            model = msgspec.defstruct(schema["name"], fields, namespace=namespace, kw_only=True)
+        classes[schema["name"]] = model
+
+    record_type_to_model(schema, _MainModel)
+    return classes[schema["name"]]
+
+
 def convert_file(avsc_path: str, output_path: Optional[str] = None):
     with open(avsc_path, "r") as fh:
         avsc_dict = json.load(fh)
@@ -0,0 +1,108 @@
+import logging
+import threading
+
+from starter_service.env import ENV
+from starter_service.metrics import Metrics
+
+_logger = logging.getLogger(__name__)
+
+
+class BackpressureController(threading.Thread):
+    """
+    Pauses consumers of a KafkaAdapter while the service is overloaded and resumes them once it recovered.
+
+    The service is overloaded when the worker queue is filled above the high watermark, when the moving average of
+    handler latency is above BACKPRESSURE_MAX_LATENCY_MS or when ready() returns False. Consumers are resumed only
+    when the queue is below the low watermark, latency is below BACKPRESSURE_RESUME_RATIO of the limit and ready()
+    returns True again, so the consumers do not flap between the two states.
+    """
+    REASON = "backpressure"
+
+    def __init__(self, adapter, interval_ms=None, queue_size=None, high_watermark=None, low_watermark=None,
+                 max_latency_ms=None, resume_ratio=None, alpha=0.2):
+        super().__init__(name="BackpressureController", daemon=True)
+        self.adapter = adapter
+        self.interval = (ENV.BACKPRESSURE_INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+        queue_size = ENV.WORKER_QUEUE_SIZE if queue_size is None else queue_size
+        self.high = queue_size * (ENV.BACKPRESSURE_HIGH_WATERMARK if high_watermark is None else high_watermark)
+        self.low = queue_size * (ENV.BACKPRESSURE_LOW_WATERMARK if low_watermark is None else low_watermark)
+        max_latency_ms = ENV.BACKPRESSURE_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms
+        self.max_latency = max_latency_ms / 1000 if max_latency_ms else None
+        self.resume_ratio = ENV.BACKPRESSURE_RESUME_RATIO if resume_ratio is None else resume_ratio
+        self.alpha = alpha
+        self.latency = 0.0
+        self.paused = False
+
+        self._observed = False
+        self._stopped = threading.Event()
+        Metrics.gauge("starter_handler_latency_ewma_seconds", "Moving average of handler latency",
+                      lambda: self.latency)
+
+    def observe(self, latency):
+        """Record the latency of a handler call in seconds"""
+        self.latency += self.alpha * (latency - self.latency)
+        self._observed = True
+
+    def run(self):
+        _logger.info(f"Backpressure controller started, watermarks {self.low}/{self.high}, "
+                     f"max latency {self.max_latency}")
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                _logger.error(f"Backpressure check failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        if self.paused:
+            self.adapter.resume_consuming(self.REASON)
+            self.paused = False
+
+    def check(self):
+        """Pause or resume consumers, returns (reason, detail) when consumers were paused"""
+        # Without new calls the average decays, a paused service would never see its latency recover otherwise
+        if not self._observed:
+            self.latency *= 1 - self.alpha
+        self._observed = False
+
+        reason = self._overloaded() if not self.paused else None
+        if reason:
+            _logger.warning(f"Pausing consumers: {reason[1]}")
+            Metrics.inc("starter_backpressure_pauses_total", (("reason", reason[0]),))
+            self.adapter.pause_consuming(self.REASON)
+            self.paused = True
+        elif self.paused and self._recovered():
+            _logger.info("Resuming consumers, load recovered")
+            self.adapter.resume_consuming(self.REASON)
+            self.paused = False
+        return reason
+
+    def _overloaded(self):
+        depth = self.adapter.in_flight
+        if depth >= self.high > 0:
+            return "queue", f"{depth} messages in flight"
+        if self.max_latency and self.latency > self.max_latency:
+            return "latency", f"handler latency {self.latency * 1000:.1f} ms"
+        if not self._ready():
+            return "ready", "ready() returned False"
+        return None
+
+    def _recovered(self):
+        if self.adapter.in_flight > self.low:
+            return False
+        if self.max_latency and self.latency > self.max_latency * self.resume_ratio:
+            return False
+        return self._ready()
+
+    def _ready(self):
+        service = self.adapter.base_service
+        if service is None:
+            return True
+        try:
+            return bool(service.ready())
+        except Exception as e:
+            _logger.error(f"ready() failed: {e}")
+            return False
+
+
+Metrics.describe("starter_backpressure_pauses_total", "counter", "Consumer pauses by the backpressure controller")
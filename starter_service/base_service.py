@@ -2,14 +2,18 @@ import logging
 import sys
 import threading
 from abc import ABC, abstractmethod
-from time import sleep
+from time import perf_counter
 
+from starter_service.api import API
 from starter_service.api_server import APIServer
 from starter_service.env import ENV
 from starter_service.kafka_adapter import KafkaAdapter
+from starter_service.metrics import Metrics
+from starter_service.logs import configure_logging
 from starter_service.schemas import SchemaRegistry
+from starter_service.supervisor import Supervisor
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+configure_logging()
 
 
 class StarterService(ABC):
@@ -24,8 +28,11 @@ class StarterService(ABC):
         # Initialize services
         self.kafka = None
         self.api = None
+        self._start_time = None
 
         self._initialize()
+        Metrics.gauge("starter_startup_seconds", "Seconds from start() until each startup phase completed",
+                      self._startup_seconds)
 
     @abstractmethod
     def ready(self) -> bool:
@@ -42,6 +49,8 @@ class StarterService(ABC):
         self.name = ENV.CLIENT_ID = ENV.CLIENT_ID or self.name or self.__class__.__name__
         # Initialize schema registry
         SchemaRegistry.initialize(self.path)
+        # Index registered routes
+        API.freeze()
         # Initialize services
         self._init_kafka()
         # Initialize API
@@ -68,15 +77,19 @@ class StarterService(ABC):
             self.kafka_callback(error=e)
 
     def start(self):
-        """Start the service"""
+        """Start the service, in SERVICE_WORKERS processes when it is more than 1"""
+        if ENV.SERVICE_WORKERS > 1 and not Supervisor.is_worker():
+            Supervisor(self).run()
+            return
+        self._start_time = perf_counter()
         try:
             # Start Kafka
             if self.kafka:
                 self.logger.info("Starting service Kafka...")
                 self.kafka.start()
-            # Wait for kafka to start and register schemas
+            # Wait for kafka to register schemas, the API builds its routes from them
             self.logger.info("Waiting for Kafka to start and register schemas...")
-            sleep(3)
+            self._wait_for_kafka()
             # Synchronous callback
             self.callback()
             # Asynchronous callback
@@ -93,6 +106,20 @@ class StarterService(ABC):
             self.logger.info(f"Error starting services: {e}")
             self.stop()
 
+    def _wait_for_kafka(self):
+        """Wait until Kafka registered the schemas, failed to start or KAFKA_START_TIMEOUT_S passed"""
+        if not self.kafka:
+            return
+        self.kafka.startup_settled.wait(ENV.KAFKA_START_TIMEOUT_S)
+        if not self.kafka.schemas_registered.is_set():
+            self.logger.warning("Kafka did not register schemas, starting without them")
+
+    def _startup_seconds(self):
+        if self._start_time is None:
+            return {}
+        times = {**(self.kafka.startup_times if self.kafka else {}), **(self.api.startup_times if self.api else {})}
+        return {(("phase", phase),): at - self._start_time for phase, at in times.items()}
+
     def stop(self):
         """Stop the service"""
         self.logger.info("Stopping service...")
@@ -100,7 +127,12 @@ class StarterService(ABC):
             self.logger.info("Stopping Kafka...")
             if self.kafka:
                 self.kafka.stop()
-                # self.kafka.join()
+                if self.kafka is not threading.current_thread() and self.kafka.is_alive():
+                    # The Kafka thread drains the workers, batchers and producer buffers before it exits
+                    self.kafka.join(ENV.KAFKA_STOP_TIMEOUT_S)
+                    if self.kafka.is_alive():
+                        self.logger.warning(f"Kafka did not stop within {ENV.KAFKA_STOP_TIMEOUT_S} seconds")
+                self.kafka.flush()
         except Exception as e:
             self.logger.error(f"Error stopping Kafka: {e}")
         try:
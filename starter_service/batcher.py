@@ -0,0 +1,107 @@
+import logging
+import threading
+from time import monotonic
+
+_logger = logging.getLogger(__name__)
+
+# Estimated size of numbers, booleans and None, and of every item of a nested list or dict
+_SCALAR_SIZE = 8
+_ITEM_SIZE = 32
+
+
+def estimate_size(message):
+    """
+    Estimate the encoded size of a message in bytes without serializing it. Only top level fields are looked at:
+    strings and bytes count with their length, nested lists and dicts with _ITEM_SIZE per item. Keys are included, so
+    the estimate errs on the large side for AVRO.
+    """
+    if not isinstance(message, dict):
+        return len(message) if isinstance(message, (str, bytes)) else _SCALAR_SIZE
+    size = 2
+    for key, value in message.items():
+        if isinstance(value, (str, bytes)):
+            size += len(key) + len(value) + 6
+        elif isinstance(value, (dict, list, tuple)):
+            size += len(key) + len(value) * _ITEM_SIZE + 4
+        else:
+            size += len(key) + _SCALAR_SIZE + 4
+    return size
+
+
+class MessageBatcher:
+    """
+    Collects messages and hands them over as one batch once `size` messages (or `max_bytes` as measured by `sizer`)
+    are buffered or the oldest buffered message has waited `timeout_ms`. Batches are flushed from the batcher's own
+    thread, or from the caller of flush().
+    """
+
+    def __init__(self, size, timeout_ms, flush, name="MessageBatcher", max_bytes=None, sizer=None):
+        self.size = max(1, size)
+        self.timeout = max(0, timeout_ms) / 1000
+        self.max_bytes = max_bytes if sizer else None
+        self.running = True
+
+        self._flush = flush
+        self._sizer = sizer
+        self._messages = []
+        self._bytes = 0
+        self._overflow = False
+        self._deadline = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, message):
+        """Add a message to the current batch, blocks while a full batch is waiting to be flushed"""
+        size = self._sizer(message) if self.max_bytes else 0
+        with self._condition:
+            while self.running and self._messages and (
+                    self._is_full() or (self.max_bytes and self._bytes + size > self.max_bytes)):
+                self._overflow = True
+                self._condition.notify_all()
+                self._condition.wait()
+            if not self._messages:
+                self._deadline = monotonic() + self.timeout
+            self._messages.append(message)
+            self._bytes += size
+            self._condition.notify_all()
+
+    def flush(self):
+        """Flush buffered messages now"""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._messages = self._messages, []
+                self._bytes = 0
+                self._overflow = False
+                self._condition.notify_all()
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    _logger.error(f"Failed to flush batch of {len(batch)} messages: {e}")
+
+    def stop(self):
+        """Flush buffered messages and stop the batcher thread"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _is_full(self):
+        return len(self._messages) >= self.size or (self.max_bytes and self._bytes >= self.max_bytes)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running and not self._messages:
+                    self._condition.wait()
+                while self.running and not self._overflow and not self._is_full():
+                    remaining = self._deadline - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            self.flush()
+            with self._condition:
+                if not self.running and not self._messages:
+                    break
@@ -0,0 +1,129 @@
+"""
+Throughput benchmark of the Kafka dispatch, schema and produce paths, run against the in-process LocalBroker.
+
+    python -m starter_service.benchmark --example single --rate 2000 --duration 10
+
+Every example runs in its own process, because routes are registered globally when the example module is imported.
+"""
+import argparse
+import importlib
+import inspect
+import json
+import multiprocessing
+import os
+import resource
+from time import monotonic, perf_counter, sleep
+
+EXAMPLES = ["single", "multi", "manual_kafka"]
+
+# Fine grained latency buckets from 1 microsecond to 10 seconds, so p50 and p99 can be told apart
+_BUCKETS = tuple(round(10 ** (exponent / 8), 9) for exponent in range(-48, 9))
+
+
+def run_example(example, rate, duration, payload_bytes, drain_timeout=60):
+    """Run one example against the local broker and return its results"""
+    os.environ.update({
+        "KAFKA_BACKEND": "local",
+        "SCHEMA_IN_MEMORY": "true",
+        "SCHEMA_EXPORT_CLASSES": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    from starter_service import serialization
+    from starter_service.base_service import StarterService
+    from starter_service.env import ENV
+    from starter_service.local_kafka import LocalBroker
+    from starter_service.metrics import Metrics
+
+    Metrics.buckets = _BUCKETS
+    module = importlib.import_module(f"starter_service.examples.{example}")
+    service_class = next(c for _, c in inspect.getmembers(module, inspect.isclass)
+                         if issubclass(c, StarterService) and c.__module__ == module.__name__)
+    service = service_class()
+    topics = [topic.strip() for topic in ENV.CONSUME.split(",") if topic.strip()]
+    producers = [topic.strip() for topic in ENV.PRODUCE.split(",") if topic.strip()]
+
+    service.kafka.start()
+    if not LocalBroker.wait_for_consumers(topics):
+        raise RuntimeError(f"Consumers for {topics} did not start")
+    consumers = [service.kafka.consumers[topic] for topic in topics]
+
+    total = max(1, int(rate * duration)) if rate else None
+    content = "x" * payload_bytes
+    sent = 0
+    start = perf_counter()
+    while (sent < total) if total else (perf_counter() - start < duration):
+        if rate:
+            ahead = start + sent / rate - perf_counter()
+            if ahead > 0:
+                sleep(ahead)
+        for topic in topics:
+            LocalBroker.publish(topic, {"id": str(sent), "title": f"Title {sent}", "content": content})
+        sent += 1
+
+    deadline = monotonic() + drain_timeout
+    while monotonic() < deadline:
+        if all(c.processed >= sent for c in consumers) and not service.kafka.in_flight:
+            break
+        sleep(0.001)
+    service.kafka.flush()
+    elapsed = perf_counter() - start
+    processed = min(c.processed for c in consumers)
+
+    p50 = Metrics.quantile("starter_handler_latency_seconds", 0.5)
+    p99 = Metrics.quantile("starter_handler_latency_seconds", 0.99)
+    return {
+        "example": example,
+        "sent": sent,
+        "processed": processed,
+        "produced": sum(LocalBroker.count(topic) for topic in producers),
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(processed / elapsed, 1),
+        "p50_ms": None if p50 is None else round(p50 * 1000, 3),
+        "p99_ms": None if p99 is None else round(p99 * 1000, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "serializer": serialization.engine,
+    }
+
+
+def _run_in_process(example, args, results):
+    try:
+        results.put(run_example(example, args.rate, args.duration, args.payload_bytes))
+    except Exception as e:
+        results.put({"example": example, "error": str(e)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the examples against an in-process Kafka stand-in")
+    parser.add_argument("--example", choices=EXAMPLES, action="append",
+                        help="example to run, can be repeated (default: all)")
+    parser.add_argument("--rate", type=float, default=0, help="messages per second, 0 sends as fast as possible")
+    parser.add_argument("--duration", type=float, default=5, help="seconds to send messages for")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="size of the content field of a message")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for example in args.example or EXAMPLES:
+        queue = context.Queue()
+        process = context.Process(target=_run_in_process, args=(example, args, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        results.append(result)
+        if args.json:
+            print(json.dumps(result), flush=True)
+        elif "error" in result:
+            print(f"{example:<14} error: {result['error']}", flush=True)
+        else:
+            print(f"{example:<14} {result['messages_per_second']:>10} msg/s  "
+                  f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  "
+                  f"produced {result['produced']}  max rss {result['max_rss_mb']} MB  "
+                  f"serializer {result['serializer']}", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import asyncio
+import codecs
+import json
+import logging
+from collections import deque
+from json import JSONDecodeError
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+from starter_service.serialization import dumps
+
+_logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class BulkFormatError(ValueError):
+    """Request body is not NDJSON or a JSON array"""
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Streams NDJSON while the request body is still being read. StreamingResponse would read the body concurrently to
+    detect a client disconnect and consume messages the handler is waiting for, request.stream() raises on a
+    disconnect here instead.
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except ClientDisconnect:
+            _logger.warning("Client disconnected during a bulk request")
+            return
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_json_items(chunks, max_item_size=None):
+    """
+    Parse a stream of byte chunks into JSON values as they arrive. The body is either a JSON array or values
+    separated by whitespace, which includes NDJSON. Only the current, incomplete value is kept in memory, a value
+    longer than max_item_size characters raises BulkFormatError.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    array = None
+    done = False
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        while not done:
+            pos = _skip(buffer, 0, array)
+            if pos == len(buffer):
+                buffer = ""
+                break
+            if array is None:
+                array = buffer[pos] == "["
+                if array:
+                    buffer = buffer[pos + 1:]
+                    continue
+            if array and buffer[pos] == "]":
+                done = True
+                break
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except JSONDecodeError:
+                # Incomplete value, wait for the next chunk
+                buffer = buffer[pos:]
+                if max_item_size and len(buffer) > max_item_size:
+                    raise BulkFormatError(f"Item is larger than {max_item_size} characters or invalid JSON")
+                break
+            if end == len(buffer):
+                # A number at the end of a chunk may continue in the next one
+                buffer = buffer[pos:]
+                break
+            buffer = buffer[end:]
+            yield item
+        if done:
+            break
+
+    buffer += utf8.decode(b"", final=True)
+    pos = _skip(buffer, 0, array)
+    if done or pos == len(buffer):
+        if array and not done:
+            raise BulkFormatError("JSON array is not closed")
+        return
+    try:
+        item, end = _decoder.raw_decode(buffer, pos)
+    except JSONDecodeError as e:
+        raise BulkFormatError(f"Invalid JSON: {e}")
+    yield item
+    pos = _skip(buffer, end, array)
+    if array and buffer[pos:pos + 1] != "]":
+        raise BulkFormatError("JSON array is not closed")
+    if not array and pos != len(buffer):
+        raise BulkFormatError("Invalid JSON after the last item")
+
+
+def _skip(buffer, pos, array):
+    """Skip whitespace, and the commas between array items"""
+    skip = _WHITESPACE + "," if array else _WHITESPACE
+    while pos < len(buffer) and buffer[pos] in skip:
+        pos += 1
+    return pos
+
+
+async def process_items(items, call, parallel=1, batch_size=None):
+    """
+    Call a handler for every item and yield one NDJSON line per item, in the order of the items.
+
+    Up to `parallel` calls run at the same time, items are only read from the request as calls finish, so a large
+    body is never held in memory. With batch_size the handler receives lists of up to batch_size items and returns a
+    list of responses. A failed item yields an error line and does not stop the stream.
+    """
+    pending = deque()
+    index = 0
+    try:
+        async for unit in _units(items, batch_size):
+            pending.append((index, len(unit) if batch_size else None, asyncio.ensure_future(call(unit))))
+            index += len(unit) if batch_size else 1
+            while len(pending) >= max(1, parallel):
+                for line in await _result(*pending.popleft()):
+                    yield line
+        while pending:
+            for line in await _result(*pending.popleft()):
+                yield line
+    except BulkFormatError as e:
+        while pending:
+            for line in await _result(*pending.popleft()):
+                yield line
+        yield _line({"index": index, "error": str(e)})
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+
+
+async def _units(items, batch_size):
+    if not batch_size:
+        async for item in items:
+            yield item
+        return
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _result(index, count, task):
+    """NDJSON lines of one handler call, count is the number of items of a batch call"""
+    try:
+        response = await task
+    except Exception as e:
+        return [_line({"index": i, "error": str(e)}) for i in range(index, index + (count or 1))]
+    if count is None:
+        return [_line({"index": index, "response": response})]
+    if not isinstance(response, list) or len(response) != count:
+        error = f"Batch handler returned {len(response) if isinstance(response, list) else 'no list'} " \
+                f"responses for {count} messages"
+        return [_line({"index": i, "error": error}) for i in range(index, index + count)]
+    return [_line({"index": index + i, "response": r}) for i, r in enumerate(response)]
+
+
+def _line(result):
+    return dumps(result) + b"\n"
+
+
+def caller(func, get_service, parse, is_async):
+    """Coroutine function that parses an item and calls a handler, sync handlers run on the threadpool"""
+    if is_async:
+        async def call(item):
+            return await func(get_service(), parse(item))
+    else:
+        async def call(item):
+            return await run_in_threadpool(lambda: func(get_service(), parse(item)))
+    return call
@@ -0,0 +1,246 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from time import time
+
+from starter_service.env import ENV
+from starter_service.metrics import Metrics
+from starter_service.raw_kafka import RawMessage
+from starter_service.serialization import dumps
+
+_logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread safe LRU cache with an optional time to live per entry. With max_bytes entries are also evicted once the
+    sizes returned by sizer add up to more than max_bytes.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, max_bytes=None, sizer=None):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes or None
+        self.sizer = sizer
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires, size = entry
+            if expires is not None and expires < time():
+                del self._entries[key]
+                self.bytes -= size
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires=None):
+        """Add or replace an entry, expires is an absolute timestamp and defaults to now + ttl"""
+        if expires is None and self.ttl:
+            expires = time() + self.ttl
+        size = self.sizer(value) if self.max_bytes and self.sizer else 0
+        if self.max_bytes and size > self.max_bytes:
+            return expires
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self.bytes -= previous[2]
+            self._entries[key] = (value, expires, size)
+            self.bytes += size
+            while len(self._entries) > self.max_size or (self.max_bytes and self.bytes > self.max_bytes):
+                self.bytes -= self._entries.popitem(last=False)[1][2]
+        return expires
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self.bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+def message_hash(message):
+    """
+    Canonical hash of a JSON message, equal for messages that differ only in key order. Always encoded with the json
+    module, so hashes persisted by DedupCache do not change with SERIALIZER.
+    """
+    if isinstance(message, RawMessage):
+        # Hash the original bytes instead of decoding them
+        if message.value is not None:
+            return hashlib.blake2b(message.value, digest_size=16).digest()
+        message = message.decode()
+    return hashlib.blake2b(json.dumps(message, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+def memoize(func, max_size=None, ttl=None, max_bytes=None):
+    """
+    Wrap a handler, so its response is cached by a canonical hash of the message. The service argument is not part
+    of the key, so only pure functions of the message should be memoized. Cached responses are shared between
+    calls and must not be modified. None responses are not cached, handlers that send their messages themselves
+    are called for every message.
+
+    The wrapper has the original handler as `uncached` and `cached(message, call)`, which looks up a message and
+    only calls call(message) on a miss. The worker pool uses them in process mode, so the cache stays in the parent
+    process instead of being copied into every worker process.
+    """
+    cache = LRUCache(
+        max_size=ENV.CACHE_MAX_SIZE if max_size is None else max_size,
+        ttl=ENV.CACHE_TTL_S if ttl is None else ttl,
+        max_bytes=ENV.CACHE_MAX_BYTES if max_bytes is None else max_bytes,
+        sizer=lambda response: len(dumps(response))
+    )
+    labels = (("handler", func.__name__),)
+
+    def lookup(message):
+        key = message_hash(message)
+        response = cache.get(key, _MISSING)
+        Metrics.inc("starter_cache_misses_total" if response is _MISSING else "starter_cache_hits_total", labels)
+        return key, response
+
+    def store(key, response):
+        if response is not None:
+            cache.set(key, response)
+
+    def cached(message, call):
+        key, response = lookup(message)
+        if response is _MISSING:
+            response = call(message)
+            store(key, response)
+        return response
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(service, message):
+            key, response = lookup(message)
+            if response is _MISSING:
+                response = await func(service, message)
+                store(key, response)
+            return response
+    else:
+        @functools.wraps(func)
+        def wrapper(service, message):
+            return cached(message, lambda m: func(service, m))
+
+    wrapper.cache = cache
+    wrapper.cached = cached
+    wrapper.uncached = func
+    return wrapper
+
+
+class DedupCache:
+    """
+    Remembers processed messages by key, so replayed messages can be skipped.
+
+    A message is identified by the value of its key field, or by a hash of its content when no key field is set.
+    Keys are stored as 16 byte digests. With a path the keys are also written to a memory-mapped ring buffer of
+    max_size records, which is read back on start, so the cache survives restarts.
+    """
+    _HEADER = struct.Struct("<4sIQ")  # magic, capacity, records written
+    _RECORD = struct.Struct("<16sd")  # digest, expiry timestamp
+    _MAGIC = b"SSDD"
+
+    def __init__(self, max_size=100000, ttl=None, key_field=None, path=None):
+        self.key_field = key_field
+        self.path = path
+        self._cache = LRUCache(max_size, ttl)
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap = None
+        self._written = 0
+        if path:
+            self.open(path)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def key(self, message):
+        """Return the digest that identifies a message"""
+        if self.key_field and isinstance(message, RawMessage):
+            message = message.decode()
+        if self.key_field and isinstance(message, dict) and message.get(self.key_field) is not None:
+            return hashlib.blake2b(str(message[self.key_field]).encode(), digest_size=16).digest()
+        return message_hash(message)
+
+    def seen(self, key):
+        return key in self._cache
+
+    def add(self, key):
+        """Mark a key as processed"""
+        expires = self._cache.set(key, True)
+        if self._mmap is not None:
+            with self._lock:
+                capacity = self._cache.max_size
+                offset = self._HEADER.size + (self._written % capacity) * self._RECORD.size
+                self._RECORD.pack_into(self._mmap, offset, key, expires or 0.0)
+                self._written += 1
+                self._HEADER.pack_into(self._mmap, 0, self._MAGIC, capacity, self._written)
+
+    def open(self, path):
+        """Persist keys to a file, keys stored there before are loaded"""
+        self.path = path
+        self._open(path)
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+                self._mmap.close()
+                self._file.close()
+                self._mmap = self._file = None
+
+    def _open(self, path):
+        capacity = self._cache.max_size
+        size = self._HEADER.size + capacity * self._RECORD.size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a+b")
+        if os.path.getsize(path) != size:
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        magic, stored_capacity, written = self._HEADER.unpack_from(self._mmap, 0)
+        if magic != self._MAGIC or stored_capacity != capacity:
+            # New file or written with another DEDUP_MAX_SIZE, start over
+            self._mmap[:] = bytes(size)
+            self._HEADER.pack_into(self._mmap, 0, self._MAGIC, capacity, 0)
+            _logger.info(f"Created de-duplication file {path}")
+            return
+        now = time()
+        loaded = 0
+        # Oldest records first, so the LRU order is kept
+        for i in range(max(0, written - capacity), written):
+            key, expires = self._RECORD.unpack_from(self._mmap, self._HEADER.size + (i % capacity) * self._RECORD.size)
+            if not expires or expires > now:
+                self._cache.set(key, True, expires or None)
+                loaded += 1
+        self._written = written
+        _logger.info(f"Loaded {loaded} processed message keys from {path}")
+
+
+Metrics.describe("starter_cache_hits_total", "counter", "Handler responses served from the memoization cache")
+Metrics.describe("starter_cache_misses_total", "counter", "Handler calls not found in the memoization cache")
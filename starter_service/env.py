@@ -10,6 +10,8 @@ class ENV:
     # LOGGING
     LOG_LEVEL = _env('LOG_LEVEL', 'INFO')
     DEBUG = _env.bool("DEBUG", False)
+    LOG_FORMAT = _env('LOG_FORMAT', 'text')
+    LOG_SAMPLE_EVERY = _env.int('LOG_SAMPLE_EVERY', 1)
 
     # TOPICS
     CONSUME = _env('CONSUME', '')
@@ -17,6 +19,7 @@ class ENV:
     CLIENT_ID = _env('CLIENT_ID', None)
 
     # KAFKA
+    KAFKA_BACKEND = _env('KAFKA_BACKEND', 'kafka')
     KAFKA_HOST = _env('KAFKA_HOST', '127.0.0.1:3501')
     SCHEMA_REGISTRY = _env('SCHEMA_REGISTRY', 'http://localhost:3502')
     PARTITIONER = _env("PARTITIONER", "random")
@@ -26,18 +29,87 @@ class ENV:
     MAX_POLL_INTERVAL_MS = _env.int('MAX_POLL_INTERVAL_MS', 600000)
     SESSION_TIMEOUT_MS = _env.int('SESSION_TIMEOUT_MS', 600000)
 
+    PRODUCER_BUFFERING = _env.bool('PRODUCER_BUFFERING', False)
+    PRODUCER_BATCH_SIZE = _env.int('PRODUCER_BATCH_SIZE', 100)
+    PRODUCER_BATCH_BYTES = _env.int('PRODUCER_BATCH_BYTES', MESSAGE_MAX_BYTES)
+    PRODUCER_LINGER_MS = _env.int('PRODUCER_LINGER_MS', 50)
+
+    KAFKA_INIT_WORKERS = _env.int('KAFKA_INIT_WORKERS', 8)
+    KAFKA_START_TIMEOUT_S = _env.float('KAFKA_START_TIMEOUT_S', 10)
+    KAFKA_STOP_TIMEOUT_S = _env.float('KAFKA_STOP_TIMEOUT_S', 20)
+    KAFKA_RETRY_MIN_S = _env.float('KAFKA_RETRY_MIN_S', 1)
+    KAFKA_RETRY_MAX_S = _env.float('KAFKA_RETRY_MAX_S', 30)
+
     OFFSET_TYPE = _env('OFFSET_TYPE', 'latest')
     IGNORE_TIMEOUT = _env("IGNORE_TIMEOUT", None)
     USE_LATEST = _env.bool("USE_LATEST", False)
 
+    # PROCESSES
+    SERVICE_WORKERS = _env.int('SERVICE_WORKERS', 1)
+    SERVICE_HEARTBEAT_INTERVAL_S = _env.float('SERVICE_HEARTBEAT_INTERVAL_S', 1)
+    SERVICE_HEARTBEAT_TIMEOUT_S = _env.float('SERVICE_HEARTBEAT_TIMEOUT_S', 30)
+    SERVICE_START_TIMEOUT_S = _env.float('SERVICE_START_TIMEOUT_S', 60)
+    SERVICE_STOP_TIMEOUT_S = _env.float('SERVICE_STOP_TIMEOUT_S', 30)
+    SERVICE_RESTART_DELAY_S = _env.float('SERVICE_RESTART_DELAY_S', 5)
+
+    # WORKERS
+    WORKER_MODE = _env('WORKER_MODE', 'inline')
+    WORKER_COUNT = _env.int('WORKER_COUNT', 4)
+    WORKER_QUEUE_SIZE = _env.int('WORKER_QUEUE_SIZE', 100)
+    WORKER_ORDERING_KEY = _env('WORKER_ORDERING_KEY', None)
+
+    FANOUT_ENABLED = _env.bool('FANOUT_ENABLED', False)
+    FANOUT_WORKERS = _env.int('FANOUT_WORKERS', 8)
+    FANOUT_COPY = _env('FANOUT_COPY', 'shallow')
+
+    # BACKPRESSURE
+    BACKPRESSURE_ENABLED = _env.bool('BACKPRESSURE_ENABLED', False)
+    BACKPRESSURE_INTERVAL_MS = _env.int('BACKPRESSURE_INTERVAL_MS', 500)
+    BACKPRESSURE_HIGH_WATERMARK = _env.float('BACKPRESSURE_HIGH_WATERMARK', 0.8)
+    BACKPRESSURE_LOW_WATERMARK = _env.float('BACKPRESSURE_LOW_WATERMARK', 0.3)
+    BACKPRESSURE_MAX_LATENCY_MS = _env.int('BACKPRESSURE_MAX_LATENCY_MS', 0)
+    BACKPRESSURE_RESUME_RATIO = _env.float('BACKPRESSURE_RESUME_RATIO', 0.7)
+
+    # DE-DUPLICATION
+    DEDUP_ENABLED = _env.bool('DEDUP_ENABLED', False)
+    DEDUP_KEY = _env('DEDUP_KEY', None)
+    DEDUP_MAX_SIZE = _env.int('DEDUP_MAX_SIZE', 100000)
+    DEDUP_TTL_S = _env.int('DEDUP_TTL_S', 86400)
+    DEDUP_PATH = _env('DEDUP_PATH', None)
+
+    # HANDLER CACHE
+    CACHE_MAX_SIZE = _env.int('CACHE_MAX_SIZE', 10000)
+    CACHE_TTL_S = _env.int('CACHE_TTL_S', 3600)
+    CACHE_MAX_BYTES = _env.int('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+    # BATCHING
+    BATCH_SIZE = _env.int('BATCH_SIZE', 32)
+    BATCH_TIMEOUT_MS = _env.int('BATCH_TIMEOUT_MS', 100)
+
     # REST API
     REST_API_ENABLED = _env.bool('REST_API_ENABLED', True)
     REST_API_PORT = _env.int('REST_API_PORT', 8080)
     REST_API_HOST = _env('REST_API_HOST', '0.0.0.0')
+    REST_API_REUSE_PORT = _env.bool('REST_API_REUSE_PORT', False)
+    REST_BULK_ENABLED = _env.bool('REST_BULK_ENABLED', False)
+    REST_BULK_MAX_PARALLEL = _env.int('REST_BULK_MAX_PARALLEL', 16)
+    REST_JOBS_ENABLED = _env.bool('REST_JOBS_ENABLED', False)
+    JOBS_MAX_PENDING = _env.int('JOBS_MAX_PENDING', 1000)
+    JOBS_MAX_SIZE = _env.int('JOBS_MAX_SIZE', 10000)
+    JOBS_TTL_S = _env.int('JOBS_TTL_S', 3600)
+    JOBS_STORE_RESULTS = _env.bool('JOBS_STORE_RESULTS', True)
     REST_LOG_MESSAGES = _env.bool('REST_LOG_MESSAGES', False)
+    FAST_VALIDATION = _env.bool('FAST_VALIDATION', False)
+    SERIALIZER = _env('SERIALIZER', 'auto')
+    REST_TRUST_OUTPUT = _env.bool('REST_TRUST_OUTPUT', False)
+    METRICS_ENABLED = _env.bool('METRICS_ENABLED', True)
 
     # OTHER
     LOCAL_SCHEMA_REGISTRY_ENABLED = _env.bool('LOCAL_SCHEMA_REGISTRY_ENABLED', True)
+    SCHEMA_IN_MEMORY = _env.bool('SCHEMA_IN_MEMORY', False)
+    SCHEMA_EXPORT_CLASSES = _env.bool('SCHEMA_EXPORT_CLASSES', True)
+    SCHEMA_TARGET = _env('SCHEMA_TARGET', 'pydantic')
+    SCHEMA_TARGETS = _env.dict('SCHEMA_TARGETS', {})
 
     def update(self, **kwargs):
         for key, value in kwargs.items():
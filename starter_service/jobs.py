@@ -0,0 +1,79 @@
+import threading
+import uuid
+from time import time
+
+from starter_service.cache import LRUCache
+from starter_service.env import ENV
+from starter_service.metrics import Metrics
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are queued or running"""
+
+
+class JobStore:
+    """
+    Bounded store of the jobs submitted through the REST API.
+
+    Jobs are kept for JOBS_TTL_S or until JOBS_MAX_SIZE newer jobs were submitted, whichever comes first. At most
+    JOBS_MAX_PENDING jobs can be queued or running, create() raises JobQueueFull above that.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, max_size=None, ttl=None, max_pending=None, store_results=None):
+        self.max_pending = ENV.JOBS_MAX_PENDING if max_pending is None else max_pending
+        self.store_results = ENV.JOBS_STORE_RESULTS if store_results is None else store_results
+        self._jobs = LRUCache(max_size=ENV.JOBS_MAX_SIZE if max_size is None else max_size,
+                              ttl=ENV.JOBS_TTL_S if ttl is None else ttl)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def create(self, route):
+        """Add a queued job for a route and return its id"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs are queued or running")
+            self._pending += 1
+        job_id = uuid.uuid4().hex
+        self._jobs.set(job_id, {"id": job_id, "route": route.path, "status": self.QUEUED, "submitted": time()})
+        return job_id
+
+    def discard(self, job_id):
+        """Remove a job that could not be queued, it does not count as pending anymore"""
+        with self._lock:
+            self._pending -= 1
+        self._jobs.discard(job_id)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def start(self, job_id):
+        self._update(job_id, status=self.RUNNING, started=time())
+
+    def finish(self, job_id, response):
+        self._done(job_id, self.DONE, response=response if self.store_results else None)
+
+    def fail(self, job_id, error):
+        self._done(job_id, self.FAILED, error=str(error))
+
+    def _done(self, job_id, status, **fields):
+        with self._lock:
+            self._pending -= 1
+        Metrics.inc("starter_jobs_total", (("status", status),))
+        self._update(job_id, status=status, finished=time(), **fields)
+
+    def _update(self, job_id, **fields):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            # Replaced instead of modified, so readers never see a half updated job
+            self._jobs.set(job_id, {**job, **fields})
+
+
+Metrics.describe("starter_jobs_total", "counter", "Finished REST jobs per status")
@@ -1,5 +1,9 @@
+import asyncio
 import logging
-from time import sleep
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy, deepcopy
+from time import perf_counter
 
 from test_bed_adapter import TestBedAdapter
 from test_bed_adapter import TestBedOptions
@@ -8,11 +12,23 @@ from test_bed_adapter.kafka.log_manager import LogManager
 from test_bed_adapter.kafka.producer_manager import ProducerManager
 
 from starter_service.api import API
+from starter_service.backpressure import BackpressureController
+from starter_service.batcher import MessageBatcher, estimate_size
+from starter_service.cache import DedupCache
 from starter_service.env import ENV
+from starter_service.jobs import JobQueueFull, JobStore
+from starter_service.local_kafka import LocalConsumerManager, LocalLogManager, LocalProducerManager, \
+    LocalTestBedAdapter
+from starter_service.logs import MessageLog, Truncated, configure_logging
+from starter_service.metrics import Metrics
+from starter_service.raw_kafka import RawConsumerManager, RawMessage, RawProducerManager, unwrap
 from starter_service.schemas import SchemaRegistry
+from starter_service.serialization import Serialized
 from starter_service.sub_process import SubProcess
+from starter_service.supervisor import Supervisor
+from starter_service.worker_pool import WorkerPool, WorkerPoolFull, call_handler
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+configure_logging()
 
 
 class KafkaAdapter(SubProcess):
@@ -31,48 +47,112 @@ class KafkaAdapter(SubProcess):
         # Initialize producers and consumers
         self._producers = {}
         self._consumers = {}
+        self._producer_buffers = {}
+        # Producers that forward the original bytes of passthrough messages
+        self._raw_producers = {}
         # Initialize logger
         self.logger = logging.getLogger(__name__)
+        # Per-message records are sampled and never sent through the Kafka log producer
+        self._message_log = MessageLog()
         self.error_msg = None
-        self.paused = False
+        # Consumers are paused while any reason is set, e.g. "manual", "workers" or "backpressure"
+        self._pause_reasons = set()
+        self._pause_lock = threading.Lock()
+        # Initialize worker pool
+        self._worker_pool = None
+        self._backpressure = BackpressureController(self) if ENV.BACKPRESSURE_ENABLED else None
+        # Threads that run the handlers of one message at the same time, see FANOUT_ENABLED. Created up front, the
+        # worker lanes dispatch messages at the same time and share it
+        self._fanout_executor = None
+        if ENV.FANOUT_ENABLED:
+            self._fanout_executor = ThreadPoolExecutor(max_workers=ENV.FANOUT_WORKERS, thread_name_prefix="FanOut")
+        # Messages submitted through the REST API, run on the worker pool or on their own threads in inline mode
+        self.jobs = JobStore()
+        self._job_executor = None
+        # Initialize de-duplication of replayed messages, DEDUP_PATH is opened in run(), see _open_dedup
+        self._dedup = None
+        if ENV.DEDUP_ENABLED:
+            self._dedup = DedupCache(max_size=ENV.DEDUP_MAX_SIZE, ttl=ENV.DEDUP_TTL_S, key_field=ENV.DEDUP_KEY)
+        Metrics.gauge("starter_in_flight_messages", "Messages queued or running on the worker pool",
+                      lambda: self.in_flight)
+        Metrics.gauge("starter_consumer_paused", "1 when consuming is paused",
+                      lambda: int(self.paused))
+        # Initialize batchers for batch handlers, keyed by (topic, func)
+        self._batchers = {}
+        # Startup signals, see StarterService.start
+        self.schemas_registered = threading.Event()
+        self.consumers_started = threading.Event()
+        self.startup_failed = threading.Event()
+        # Set once schemas were registered or a start failed, whichever comes first
+        self.startup_settled = threading.Event()
+        self.startup_times = {}
+        # Set by stop() and when a consumer thread exits while the service is running
+        self._stopped = threading.Event()
 
     def run(self):
-        """Start the service"""
-        try:
-            self._test_bed_adapter = TestBedAdapter(self._test_bed_options)
-            self.logger = LogManager(options=self._test_bed_options)
-            self.logger.info(f"Kafka ClientId[{ENV.CLIENT_ID}], Consume[{ENV.CONSUME}], Produce[{ENV.PRODUCE}]")
-            self.connect()
-            self.error_msg = None
-        except Exception as e:
-            self.error_msg = f"Error starting service: {e}"
-            self.logger.error(f"Error starting service: {e}, Restarting... in 30 seconds")
-            sleep(30)
-            self.run()
+        """Start the service, failed starts are retried with exponential backoff"""
+        attempt = 0
+        self._open_dedup()
+        while self.running:
+            try:
+                if ENV.KAFKA_BACKEND == "local":
+                    self._test_bed_adapter = LocalTestBedAdapter(self._test_bed_options)
+                    self.logger = LocalLogManager(options=self._test_bed_options)
+                else:
+                    self._test_bed_adapter = TestBedAdapter(self._test_bed_options)
+                    self.logger = LogManager(options=self._test_bed_options)
+                self.logger.info(f"Kafka ClientId[{ENV.CLIENT_ID}], Consume[{ENV.CONSUME}], Produce[{ENV.PRODUCE}]")
+                self._init_worker_pool()
+                if self._backpressure and not self._backpressure.is_alive():
+                    self._backpressure.start()
+                self.connect()
+                self.error_msg = None
+                return
+            except Exception as e:
+                delay = min(ENV.KAFKA_RETRY_MAX_S, ENV.KAFKA_RETRY_MIN_S * 2 ** attempt)
+                attempt += 1
+                self.error_msg = f"Error starting service: {e}"
+                self.logger.error(f"Error starting service: {e}, Restarting... in {delay} seconds")
+                self.startup_failed.set()
+                self.startup_settled.set()
+                self._stopped.wait(delay)
+        # Stopped before a start succeeded
+        self.startup_settled.set()
+
+    def stop(self):
+        """Stop the service"""
+        super().stop()
+        self._stopped.set()
+
+    def _open_dedup(self):
+        """
+        Open DEDUP_PATH in the process that consumes. The adapter is created before SERVICE_WORKERS processes are
+        forked, so every worker writes its own file, suffixed with the worker index, instead of one shared mapping.
+        """
+        if self._dedup is None or not ENV.DEDUP_PATH or self._dedup.path:
+            return
+        path = ENV.DEDUP_PATH
+        if Supervisor.is_worker():
+            path = f"{path}.{Supervisor.worker_index}"
+        self._dedup.open(path)
 
     def connect(self):
         """Start the service"""
-        self._init_producers()
-        self._test_bed_adapter.initialize()
+        # Producers, consumers and the test bed adapter do not depend on each other, every topic fetches and
+        # registers its schema on its own thread
+        with ThreadPoolExecutor(max_workers=ENV.KAFKA_INIT_WORKERS, thread_name_prefix="KafkaInit") as pool:
+            tasks = [pool.submit(self._test_bed_adapter.initialize)]
+            tasks += [pool.submit(self._init_producer, topic) for topic in self._topics(ENV.PRODUCE)]
+            tasks += [pool.submit(self._init_consumer, topic) for topic in self._topics(ENV.CONSUME)]
+            errors = [error for error in (task.exception() for task in tasks) if error]
+        if errors:
+            # Producers and consumers are created again on the next attempt
+            self._discard_clients()
+            raise errors[0]
         self._init_logger()
-        # Create threads for each consume topic
-        for topic in ENV.CONSUME.split(','):
-            topic = topic.strip()
-            if not topic:
-                self.logger.warning("Empty topic, skipping")
-                continue
-            try:
-                _consumer = ConsumerManager(
-                    options=self._test_bed_options,
-                    kafka_topic=topic,
-                    handle_message=self._handle_message
-                )
-                self._consumers[topic] = _consumer
-                self.logger.info(f"Registering schema from kafka for {topic}")
-                SchemaRegistry.register_schema(_consumer.schema_str, topic)
-            except Exception as e:
-                self.logger.error(f"Could not initialize consumer for topic {topic}, {e}")
-                self.error_msg = f"Could not initialize consumer for topic {topic}, {e}"
+        self.startup_times["schemas"] = perf_counter()
+        self.schemas_registered.set()
+        self.startup_settled.set()
 
         if self._callback:
             self._callback()
@@ -85,14 +165,16 @@ class KafkaAdapter(SubProcess):
             except Exception as e:
                 self.logger.error(f"Could not start consumer, {e}")
                 self.error_msg = f"Could not start consumer, {e}"
+                continue
+            threading.Thread(target=self._watch_consumer, args=(topic, consumer), name=f"ConsumerWatch-{topic}",
+                             daemon=True).start()
+        self.startup_times["consumers"] = perf_counter()
+        self.consumers_started.set()
 
-        while self.running:
-            for consumer in self._consumers.values():
-                if not consumer.is_alive():
-                    self.logger.error("Consumer thread died, exiting...")
-                    self.running = False
-                    break
-            sleep(10)
+        self._stopped.wait()
+
+        if self._backpressure:
+            self._backpressure.stop()
 
         for consumer in self._consumers.values():
             try:
@@ -101,49 +183,138 @@ class KafkaAdapter(SubProcess):
             except:
                 self.logger.error("Could not stop consumer")
 
+        for batcher in self._batchers.values():
+            batcher.stop()
+
+        if self._worker_pool:
+            self._worker_pool.stop()
+
+        for buffer in self._producer_buffers.values():
+            buffer.stop()
+
+        for raw_producer in self._raw_producers.values():
+            raw_producer.stop()
+
+        if self._fanout_executor:
+            self._fanout_executor.shutdown(wait=True)
+
+        if self._job_executor:
+            self._job_executor.shutdown(wait=True)
+
+        if self._dedup is not None:
+            self._dedup.close()
+
         self.logger.info("Stopping service...")
         self.base_service.stop()
 
+    def _watch_consumer(self, topic, consumer):
+        """Stop the service once a consumer thread exits while the service is running"""
+        consumer.join()
+        if self.running:
+            self.logger.error(f"Consumer thread for topic {topic} died, exiting...")
+            self.running = False
+            self._stopped.set()
+
+    def _discard_clients(self):
+        """Stop the producers and consumers of a failed start"""
+        clients = [*self._producer_buffers.values(), *self._raw_producers.values(), *self._consumers.values(),
+                   *self._producers.values()]
+        for client in clients:
+            try:
+                client.stop()
+            except Exception as e:
+                self.logger.error(f"Could not stop {client.__class__.__name__}: {e}")
+        self._producer_buffers, self._raw_producers, self._consumers, self._producers = {}, {}, {}, {}
+
+    @property
+    def in_flight(self):
+        """Messages queued or running on the worker pool"""
+        return self._worker_pool.in_flight if self._worker_pool else 0
+
+    @property
+    def consumers(self):
+        return self._consumers
+
     def send_message(self, message, topics=None, testing=False):
         """Send message to kafka topic"""
         if testing:
-            self.logger.info(f"Sending test message to {topics}\n{message}")
+            self._message_log.info("Sending test message to %s\n%s", topics, Truncated(message))
             return
 
         if topics:
             if isinstance(topics, str):
                 topics = [topic.strip() for topic in topics.split(',')]
             for topic in topics:
-                self.logger.info(f"Sending message to {topic}")
+                self._message_log.info("Sending message to %s", topic, topic=topic)
                 if topic in self._producers:
-                    if ENV.DEBUG:
-                        self.logger.info(f"Sending message to {topic}\n{message}")
-                    self._producers[topic].send_messages(messages=[message])
+                    self._produce(topic, message)
         else:
-            for topic, producer in self._producers.items():
-                if ENV.DEBUG:
-                    self.logger.info(f"Sending message to {topic}\n{message}")
-                producer.send_messages(messages=[message])
-
-    def pause_consuming(self):
-        """Pause consuming all topics"""
-        if not self.paused:
-            for topic, consumer in self._consumers.items():
-                try:
-                    consumer.pause(topic)
-                except Exception as e:
-                    self.logger.error(f"Could not pause consumer: {e}")
-            self.paused = True
-
-    def resume_consuming(self):
-        """Resume consuming all topics"""
-        if self.paused:
-            for topic, consumer in self._consumers.items():
-                try:
-                    consumer.resume(topic)
-                except Exception as e:
-                    self.logger.error(f"Could not resume consumer: {e}")
-            self.paused = False
+            for topic in self._producers:
+                self._produce(topic, message)
+
+    def flush(self):
+        """Send all buffered messages"""
+        for topic, buffer in self._producer_buffers.items():
+            try:
+                buffer.flush()
+            except Exception as e:
+                self.logger.error(f"Could not flush producer for topic {topic}: {e}")
+
+    def _produce(self, topic, message):
+        if ENV.DEBUG:
+            self._message_log.info("Sending message to %s\n%s", topic, Serialized(message), topic=topic)
+        Metrics.inc("starter_messages_produced_total", (("topic", topic),))
+        if isinstance(message, RawMessage):
+            raw_producer = self._raw_producers.get(topic)
+            if raw_producer is not None and raw_producer.accepts(message):
+                self._send_messages(topic, raw_producer, [message])
+                return
+            # Different schema or no raw producer, the message is encoded again
+            message = message.decode()
+        buffer = self._producer_buffers.get(topic)
+        if buffer:
+            buffer.add(message)
+        else:
+            self._send_messages(topic, self._producers[topic], [message])
+
+    @staticmethod
+    def _send_messages(topic, producer, messages):
+        start = perf_counter()
+        try:
+            producer.send_messages(messages=messages)
+        finally:
+            Metrics.observe("starter_produce_latency_seconds", perf_counter() - start, (("topic", topic),))
+
+    @property
+    def paused(self):
+        return bool(self._pause_reasons)
+
+    def pause_consuming(self, reason="manual"):
+        """Pause consuming all topics, consumers stay paused until every reason is resumed"""
+        with self._pause_lock:
+            if reason in self._pause_reasons:
+                return
+            paused = self.paused
+            self._pause_reasons.add(reason)
+            if not paused:
+                for consumer in self._consumers.values():
+                    try:
+                        consumer.pause()
+                    except Exception as e:
+                        self.logger.error(f"Could not pause consumer: {e}")
+
+    def resume_consuming(self, reason="manual"):
+        """Resume consuming all topics once no other reason keeps them paused"""
+        with self._pause_lock:
+            if reason not in self._pause_reasons:
+                return
+            self._pause_reasons.discard(reason)
+            if not self.paused:
+                for consumer in self._consumers.values():
+                    try:
+                        consumer.resume()
+                    except Exception as e:
+                        self.logger.error(f"Could not resume consumer: {e}")
 
     def _validate_params(self):
         """Validate that all required params are set"""
@@ -152,20 +323,113 @@ class KafkaAdapter(SubProcess):
         if not ENV.CONSUME and not ENV.PRODUCE:
             raise ValueError("Both CONSUME and PRODUCE environment parameters cannot be None.")
 
-    def _init_producers(self):
-        """Initialize all producers"""
-        for topic in ENV.PRODUCE.split(','):
+    def _topics(self, topics):
+        """Split a comma separated list of topics"""
+        result = []
+        for topic in topics.split(','):
             topic = topic.strip()
             if not topic:
                 self.logger.warning("Empty topic, skipping")
                 continue
-            self.logger.info(f"Initializing producer for topic {topic}")
-            _producer = ProducerManager(
-                options=self._test_bed_options,
-                kafka_topic=topic
-            )
-            self._producers[topic] = _producer
-            SchemaRegistry.register_schema(_producer.schema_str, topic)
+            result.append(topic)
+        return result
+
+    def _init_consumer(self, topic):
+        """Initialize the consumer of a topic and register its schema"""
+        self.logger.info(f"Initializing consumer for topic {topic}")
+        handle_message = self._handle_message
+        if ENV.KAFKA_BACKEND == "local":
+            consumer_class = LocalConsumerManager
+            if API.is_passthrough(topic):
+                # There are no bytes on the local broker, handlers get the RawMessage interface only
+                handle_message = lambda message, _topic: self._handle_message(
+                    RawMessage(decoded=message, topic=_topic), _topic)
+        else:
+            consumer_class = RawConsumerManager if API.is_passthrough(topic) else ConsumerManager
+        _consumer = consumer_class(
+            options=self._test_bed_options,
+            kafka_topic=topic,
+            handle_message=handle_message
+        )
+        self._consumers[topic] = _consumer
+        self.logger.info(f"Registering schema from kafka for {topic}")
+        self._register_schema(topic, _consumer, "consumer")
+
+    def _init_producer(self, topic):
+        """Initialize the producer of a topic and register its schema"""
+        self.logger.info(f"Initializing producer for topic {topic}")
+        producer_class = LocalProducerManager if ENV.KAFKA_BACKEND == "local" else ProducerManager
+        _producer = producer_class(
+            options=self._test_bed_options,
+            kafka_topic=topic
+        )
+        self._producers[topic] = _producer
+        if ENV.PRODUCER_BUFFERING:
+            self._producer_buffers[topic] = self._init_producer_buffer(topic, _producer)
+        if ENV.KAFKA_BACKEND != "local" and topic in API.get_passthrough_producers():
+            try:
+                self._raw_producers[topic] = RawProducerManager(options=self._test_bed_options, kafka_topic=topic)
+            except Exception as e:
+                self.logger.warning(f"Could not initialize raw producer for topic {topic}, messages are encoded: {e}")
+        self._register_schema(topic, _producer, "producer")
+
+    def _register_schema(self, topic, client, kind):
+        """
+        Register the schema a consumer or producer fetched. A schema that can not be registered only affects the REST
+        routes and typed messages of its topic, so it is logged and the client is kept instead of failing the start.
+        """
+        try:
+            schema_str = getattr(client, "schema_str", None)
+            if not schema_str:
+                raise ValueError("no schema was fetched")
+            SchemaRegistry.register_schema(schema_str, topic)
+        except Exception as e:
+            self.logger.error(f"Could not register schema of {kind} for topic {topic}, {e}")
+            self.error_msg = f"Could not register schema of {kind} for topic {topic}, {e}"
+
+    @staticmethod
+    def _init_producer_buffer(topic, producer):
+        """Buffer messages for a producer and send them in batches"""
+        def flush(messages):
+            try:
+                KafkaAdapter._send_messages(topic, producer, messages)
+            except Exception:
+                # The batcher logs the error, the messages are not sent again
+                Metrics.inc("starter_messages_dropped_total", (("topic", topic),), len(messages))
+                raise
+
+        return MessageBatcher(
+            size=ENV.PRODUCER_BATCH_SIZE,
+            timeout_ms=ENV.PRODUCER_LINGER_MS,
+            flush=flush,
+            name=f"ProducerBuffer-{topic}",
+            max_bytes=min(ENV.PRODUCER_BATCH_BYTES, ENV.MESSAGE_MAX_BYTES),
+            sizer=estimate_size
+        )
+
+    def _init_worker_pool(self):
+        """Initialize worker pool for handlers, messages are handled inline on the consumer thread otherwise"""
+        if ENV.WORKER_MODE == "inline" or self._worker_pool:
+            return
+        self._worker_pool = WorkerPool(
+            mode=ENV.WORKER_MODE,
+            workers=ENV.WORKER_COUNT,
+            queue_size=ENV.WORKER_QUEUE_SIZE,
+            service=self._base_service,
+            on_full=self._on_workers_full,
+            on_drain=self._on_workers_drained
+        )
+        self._worker_pool.start()
+
+    def _on_workers_full(self):
+        """Stop pulling messages while the worker pool is full"""
+        self.logger.warning("Worker queue is full, pausing consumers")
+        self.pause_consuming("workers")
+
+    def _on_workers_drained(self):
+        """Resume consumers paused by a full worker pool"""
+        self.logger.info("Worker queue drained")
+        self.resume_consuming("workers")
 
     def _init_logger(self):
         try:
@@ -191,16 +455,222 @@ class KafkaAdapter(SubProcess):
         self._test_bed_options = TestBedOptions(_options)
 
     def _handle_message(self, message, topic):
-        self.logger.info(f"Received message for topic {topic}")
+        self._message_log.info("Received message for topic %s", topic, topic=topic)
         if ENV.DEBUG:
-            self.logger.info(f"Message {message}")
+            self._message_log.info("Message %s", Serialized(message), topic=topic)
+        Metrics.inc("starter_messages_received_total", (("topic", topic),))
 
-        funcs = API.get_func_by_consumer(topic)
-        for consumer, producer, doc, func, _type in funcs:
-            try:
-                response = func(self._base_service, message)
-                if producer and response:
-                    self.logger.info(f"Sending response: {producer}, {str(response)[:100]}")
+        key = None
+        if self._dedup is not None:
+            key = self._dedup.key(message)
+            if self._dedup.seen(key):
+                Metrics.inc("starter_messages_deduplicated_total", (("topic", topic),))
+                return
+
+        funcs, batch_funcs = API.get_routes(topic)
+        for route in batch_funcs:
+            self._get_batcher(topic, route).add(message)
+        if not funcs:
+            # Batch handlers only, the message counts as processed once it is queued
+            if key is not None:
+                self._dedup.add(key)
+            return
+        if self._worker_pool:
+            dispatch = self._dispatch_async if self._worker_pool.is_async else self._dispatch
+            self._worker_pool.submit(self._ordering_key(message), dispatch, funcs, message, key)
+        else:
+            self._dispatch(funcs, message, key)
+
+    def submit_job(self, route, message):
+        """
+        Queue a message submitted through the REST API for a route, its response is sent to the producer topic like
+        the response to a Kafka message. Returns the job id, raises JobQueueFull when too many jobs are pending or the
+        worker pool is full.
+        """
+        job_id = self.jobs.create(route)
+        try:
+            if self._worker_pool:
+                dispatch = self._dispatch_job_async if self._worker_pool.is_async else self._dispatch_job
+                key = None if route.batch else self._ordering_key(message)
+                # Jobs never queue above WORKER_QUEUE_SIZE, there is no consumer to pause for them
+                self._worker_pool.submit(key, dispatch, route, message, job_id, reject=True)
+            else:
+                self._get_job_executor().submit(self._dispatch_job, route, message, job_id)
+        except WorkerPoolFull as e:
+            self.jobs.discard(job_id)
+            raise JobQueueFull(f"worker pool is full, {e}")
+        except Exception:
+            self.jobs.discard(job_id)
+            raise
+        return job_id
+
+    def _dispatch_job(self, route, message, job_id):
+        self.jobs.start(job_id)
+        try:
+            response = self._call(route, message)
+            (self._send_responses if route.batch else self._send_response)(route.producer, response)
+        except Exception as e:
+            self.logger.error(e)
+            self.jobs.fail(job_id, e)
+            return
+        self.jobs.finish(job_id, unwrap(response))
+
+    async def _dispatch_job_async(self, route, message, job_id):
+        self.jobs.start(job_id)
+        try:
+            response = await self._call_async(route, message)
+            send = self._send_responses if route.batch else self._send_response
+            await asyncio.get_running_loop().run_in_executor(None, send, route.producer, response)
+        except Exception as e:
+            self.logger.error(e)
+            self.jobs.fail(job_id, e)
+            return
+        self.jobs.finish(job_id, unwrap(response))
+
+    def _dispatch(self, funcs, message, key=None):
+        """Run handlers for a message and send their responses, the message is marked processed if none failed"""
+        if self._fanout_executor and len(funcs) > 1:
+            # Every handler gets its own copy, so they can run at the same time
+            copies = [self._copy_message(message) for _ in funcs]
+            succeeded = list(self._fanout_executor.map(self._dispatch_route, funcs, copies))
+        else:
+            succeeded = [self._dispatch_route(route, message) for route in funcs]
+        if key is not None and all(succeeded):
+            self._dedup.add(key)
+
+    def _dispatch_route(self, route, message):
+        """Run one handler and send its response, returns False if it failed"""
+        try:
+            self._send_response(route.producer, self._call(route, message))
+            return True
+        except Exception as e:
+            self.logger.error(e)
+            return False
+
+    def _dispatch_batch(self, route, messages):
+        """Run a batch handler and send every response of the returned list"""
+        try:
+            self._send_responses(route.producer, self._call(route, messages))
+        except Exception as e:
+            self.logger.error(e)
+
+    async def _dispatch_async(self, funcs, message, key=None):
+        """Await handlers for a message on the worker pool event loop and send their responses"""
+        if ENV.FANOUT_ENABLED and len(funcs) > 1:
+            copies = [self._copy_message(message) for _ in funcs]
+            succeeded = await asyncio.gather(*map(self._dispatch_route_async, funcs, copies))
+        else:
+            succeeded = [await self._dispatch_route_async(route, message) for route in funcs]
+        if key is not None and all(succeeded):
+            self._dedup.add(key)
+
+    async def _dispatch_route_async(self, route, message):
+        try:
+            response = await self._call_async(route, message)
+            if route.producer and response:
+                await asyncio.get_running_loop().run_in_executor(None, self._send_response, route.producer, response)
+            return True
+        except Exception as e:
+            self.logger.error(e)
+            return False
+
+    async def _dispatch_batch_async(self, route, messages):
+        """Await a batch handler on the worker pool event loop and send its responses"""
+        try:
+            responses = await self._call_async(route, messages)
+            if route.producer and responses:
+                await asyncio.get_running_loop().run_in_executor(None, self._send_responses, route.producer,
+                                                                 responses)
+        except Exception as e:
+            self.logger.error(e)
+
+    def _send_response(self, producer, response):
+        if producer and response:
+            self._message_log.info("Sending response: %s, %s", producer, Truncated(response), topic=producer)
+            self.send_message(response, topics=producer)
+
+    def _send_responses(self, producer, responses):
+        if producer and responses:
+            self._message_log.info("Sending %s responses: %s", len(responses), producer, topic=producer)
+            for response in responses:
+                if response:
                     self.send_message(response, topics=producer)
-            except Exception as e:
-                self.logger.error(e)
+
+    def _call(self, route, message):
+        message = self._message_for(route, message)
+        start = perf_counter()
+        try:
+            if self._worker_pool:
+                return self._worker_pool.execute(route.func, message)
+            return call_handler(route.func, self._base_service, message)
+        except Exception:
+            Metrics.inc("starter_handler_errors_total", route.labels)
+            raise
+        finally:
+            self._observe_latency(route, perf_counter() - start)
+
+    async def _call_async(self, route, message):
+        message = self._message_for(route, message)
+        start = perf_counter()
+        try:
+            return await self._worker_pool.execute_async(route.func, message)
+        except Exception:
+            Metrics.inc("starter_handler_errors_total", route.labels)
+            raise
+        finally:
+            self._observe_latency(route, perf_counter() - start)
+
+    @staticmethod
+    def _message_for(route, message):
+        """Decode raw messages for handlers that are not registered with passthrough"""
+        if route.passthrough:
+            return message
+        if isinstance(message, RawMessage):
+            return message.decode()
+        if isinstance(message, list) and message and isinstance(message[0], RawMessage):
+            return [m.decode() for m in message]
+        return message
+
+    def _observe_latency(self, route, latency):
+        Metrics.observe("starter_handler_latency_seconds", latency, route.labels)
+        if self._backpressure:
+            self._backpressure.observe(latency)
+
+    def _get_batcher(self, topic, route):
+        func = route[3]
+        batcher = self._batchers.get((topic, func))
+        if batcher is None:
+            def flush(messages):
+                if self._worker_pool:
+                    dispatch = self._dispatch_batch_async if self._worker_pool.is_async else self._dispatch_batch
+                    self._worker_pool.submit(None, dispatch, route, messages)
+                else:
+                    self._dispatch_batch(route, messages)
+
+            batcher = MessageBatcher(
+                size=func.batch_size or ENV.BATCH_SIZE,
+                timeout_ms=ENV.BATCH_TIMEOUT_MS if func.batch_timeout_ms is None else func.batch_timeout_ms,
+                flush=flush,
+                name=f"MessageBatcher-{topic}-{func.__name__}"
+            )
+            self._batchers[(topic, func)] = batcher
+        return batcher
+
+    def _get_job_executor(self):
+        if self._job_executor is None:
+            self._job_executor = ThreadPoolExecutor(max_workers=ENV.WORKER_COUNT, thread_name_prefix="Job")
+        return self._job_executor
+
+    @staticmethod
+    def _copy_message(message):
+        """Copy of a message for one handler, FANOUT_COPY=shallow only protects top level fields from other handlers"""
+        if ENV.FANOUT_COPY == "deep":
+            return deepcopy(message)
+        return copy(message)
+
+    @staticmethod
+    def _ordering_key(message):
+        """Key that keeps messages in order on the worker pool, None when ordering is not needed"""
+        if ENV.WORKER_ORDERING_KEY and isinstance(message, (dict, RawMessage)):
+            return message.get(ENV.WORKER_ORDERING_KEY)
+        return None
@@ -0,0 +1,199 @@
+import json
+import logging
+import threading
+from collections import deque
+from queue import Queue, Empty
+from time import monotonic, sleep
+
+_logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    In-process stand-in for the Kafka broker and the schema registry, used with KAFKA_BACKEND=local.
+
+    Produced messages are delivered to the local consumers of the topic and the last `history` messages per topic are
+    kept for inspection. Topics without a registered schema get an empty record schema.
+    """
+    history = 1000
+
+    _lock = threading.Lock()
+    _schemas = {}
+    _consumers = {}
+    _produced = {}
+    _counts = {}
+
+    @classmethod
+    def register_schema(cls, topic, schema):
+        cls._schemas[topic] = schema if isinstance(schema, str) else json.dumps(schema)
+
+    @classmethod
+    def schema_str(cls, topic):
+        if topic not in cls._schemas:
+            name = "".join(part.capitalize() for part in topic.replace("-", "_").split("_"))
+            return json.dumps({"type": "record", "name": name, "fields": []})
+        return cls._schemas[topic]
+
+    @classmethod
+    def subscribe(cls, topic, consumer):
+        with cls._lock:
+            cls._consumers.setdefault(topic, []).append(consumer)
+
+    @classmethod
+    def unsubscribe(cls, topic, consumer):
+        with cls._lock:
+            if consumer in cls._consumers.get(topic, []):
+                cls._consumers[topic].remove(consumer)
+
+    @classmethod
+    def publish(cls, topic, message):
+        """Publish a message to a topic"""
+        with cls._lock:
+            cls._counts[topic] = cls._counts.get(topic, 0) + 1
+            cls._produced.setdefault(topic, deque(maxlen=cls.history)).append(message)
+            consumers = list(cls._consumers.get(topic, []))
+        for consumer in consumers:
+            consumer.deliver(message)
+
+    @classmethod
+    def produced(cls, topic):
+        """Return the last messages published to a topic"""
+        return list(cls._produced.get(topic, []))
+
+    @classmethod
+    def count(cls, topic):
+        """Return the number of messages published to a topic"""
+        return cls._counts.get(topic, 0)
+
+    @classmethod
+    def consumers(cls, topic):
+        return list(cls._consumers.get(topic, []))
+
+    @classmethod
+    def wait_for_consumers(cls, topics, timeout=30):
+        """Wait until every topic has a running consumer"""
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            if all(any(c.is_alive() for c in cls.consumers(topic)) for topic in topics):
+                return True
+            sleep(0.05)
+        return False
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._schemas, cls._consumers, cls._produced, cls._counts = {}, {}, {}, {}
+
+
+class LocalTestBedAdapter:
+    """Stand-in for TestBedAdapter"""
+
+    def __init__(self, test_bed_options):
+        self.test_bed_options = test_bed_options
+
+    def initialize(self):
+        _logger.info("Initializing local test bed")
+
+    def stop(self):
+        pass
+
+
+class LocalLogManager:
+    """Stand-in for LogManager, writes to the standard logging handlers and takes the same single message argument"""
+
+    def __init__(self, options, kafka_topic="system_logging"):
+        self.options = options
+        self.logger = logging.getLogger("starter_service.kafka")
+
+    def sill(self, msg):
+        self.logger.debug(msg)
+
+    def debug(self, msg):
+        self.logger.debug(msg)
+
+    def info(self, msg):
+        self.logger.info(msg)
+
+    def warn(self, msg):
+        self.logger.warning(msg)
+
+    def warning(self, msg):
+        self.logger.warning(msg)
+
+    def error(self, msg):
+        self.logger.error(msg)
+
+    def critical(self, msg):
+        self.logger.critical(msg)
+
+
+class LocalConsumerManager(threading.Thread):
+    """Stand-in for ConsumerManager that reads messages published to the LocalBroker"""
+
+    def __init__(self, options, kafka_topic, handle_message):
+        super().__init__()
+        self.daemon = True
+        self.running = True
+        self.options = options
+        self.kafka_topic = kafka_topic
+        self.handle_message = handle_message
+        self.schema_str = LocalBroker.schema_str(kafka_topic)
+        self.processed = 0
+
+        self._queue = Queue()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        LocalBroker.subscribe(kafka_topic, self)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def deliver(self, message):
+        self._queue.put(message)
+
+    def run(self):
+        while self.running:
+            try:
+                message = self._queue.get(timeout=0.1)
+            except Empty:
+                continue
+            # A message fetched while pausing is held until the consumer resumes
+            self._resumed.wait()
+            if not self.running:
+                break
+            try:
+                self.handle_message(message, self.kafka_topic)
+            except Exception as e:
+                _logger.error(f"Exception occurred: {e}")
+            self.processed += 1
+        LocalBroker.unsubscribe(self.kafka_topic, self)
+
+    def stop(self):
+        self.running = False
+        self._resumed.set()
+        if self.ident is None:
+            # Never started, run() does not unsubscribe
+            LocalBroker.unsubscribe(self.kafka_topic, self)
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+
+class LocalProducerManager:
+    """Stand-in for ProducerManager that publishes to the LocalBroker"""
+
+    def __init__(self, options, kafka_topic):
+        self.options = options
+        self.kafka_topic = kafka_topic
+        self.schema_str = LocalBroker.schema_str(kafka_topic)
+
+    def send_messages(self, messages: list):
+        for message in messages:
+            LocalBroker.publish(self.kafka_topic, message)
+
+    def stop(self):
+        pass
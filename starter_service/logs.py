@@ -0,0 +1,83 @@
+import logging
+import reprlib
+from itertools import count
+
+from starter_service.env import ENV
+from starter_service.serialization import dumps
+
+_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+# Attributes every LogRecord has, anything else was passed with extra= and is added to JSON logs
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def configure_logging():
+    """Apply LOG_LEVEL and LOG_FORMAT to the root logger, called once when the service is imported"""
+    root = logging.getLogger()
+    # Like logging.basicConfig, handlers configured by the application are kept
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter() if ENV.LOG_FORMAT == "json" else logging.Formatter(_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(str(ENV.LOG_LEVEL).upper())
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, fields passed with extra= are included"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps(entry).decode()
+
+
+class Truncated:
+    """
+    Lazy, size-bounded string of a payload for log arguments. Nothing is formatted unless the record is emitted and
+    nested containers are shortened before they are converted, so large payloads are never fully stringified.
+    """
+    __slots__ = ("value", "limit")
+    _repr = reprlib.Repr()
+    _repr.maxlevel, _repr.maxdict, _repr.maxlist, _repr.maxstring, _repr.maxother = 3, 8, 8, 80, 80
+
+    def __init__(self, value, limit=100):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else self._repr.repr(self.value)
+        return text if len(text) <= self.limit else text[:self.limit] + "..."
+
+
+class MessageLog:
+    """
+    Logger for per-message records on the hot path. Records use %-style arguments, so they are only formatted when
+    emitted, and only one in LOG_SAMPLE_EVERY calls is logged. Records go to the standard logging handlers, never
+    through the Kafka log producer.
+    """
+
+    def __init__(self, name="starter_service.messages", sample_every=None):
+        self.logger = logging.getLogger(name)
+        self.sample_every = max(1, ENV.LOG_SAMPLE_EVERY if sample_every is None else sample_every)
+        self._calls = count()
+
+    def info(self, msg, *args, **extra):
+        self._log(logging.INFO, msg, args, extra)
+
+    def debug(self, msg, *args, **extra):
+        self._log(logging.DEBUG, msg, args, extra)
+
+    def _log(self, level, msg, args, extra):
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.sample_every > 1 and next(self._calls) % self.sample_every:
+            return
+        self.logger.log(level, msg, *args, extra=extra or None)
@@ -0,0 +1,150 @@
+import threading
+from bisect import bisect_left
+
+from starter_service.env import ENV
+
+
+class Metrics:
+    """
+    Process wide counters, histograms and gauges rendered in the Prometheus text format.
+
+    Counters and histograms are recorded into a shard owned by the recording thread, so the hot path takes no lock.
+    Shards are summed when the metrics are rendered. Gauges are callbacks evaluated at render time.
+    """
+    enabled = ENV.METRICS_ENABLED
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _shards = []
+    _gauges = {}
+    _descriptions = {}
+
+    @classmethod
+    def describe(cls, name, _type, doc):
+        cls._descriptions[name] = (_type, doc)
+
+    @classmethod
+    def inc(cls, name, labels=(), value=1):
+        """Increment a counter, labels is a tuple of (name, value) pairs"""
+        if not cls.enabled:
+            return
+        counters = cls._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name, value, labels=()):
+        """Record a histogram observation"""
+        if not cls.enabled:
+            return
+        histograms = cls._shard()[1]
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # bucket counts, +Inf bucket, sum
+            histogram = histograms[key] = [0] * (len(cls.buckets) + 1) + [0.0]
+        histogram[bisect_left(cls.buckets, value)] += 1
+        histogram[-1] += value
+
+    @classmethod
+    def gauge(cls, name, doc, callback):
+        """Register a gauge, callback returns a value or a dict of labels to values"""
+        cls.describe(name, "gauge", doc)
+        cls._gauges[name] = callback
+
+    @classmethod
+    def collect(cls):
+        """Return (counters, histograms) summed over all threads"""
+        counters, histograms = {}, {}
+        with cls._lock:
+            shards = list(cls._shards)
+        for shard_counters, shard_histograms in shards:
+            for key, value in shard_counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, values in shard_histograms.copy().items():
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(list(values)):
+                    total[i] += value
+        return counters, histograms
+
+    @classmethod
+    def quantile(cls, name, q, labels=None):
+        """
+        Estimate a quantile of a histogram by interpolating inside its buckets, returns None without observations.
+        Histograms of every label set are merged unless labels are given.
+        """
+        merged = None
+        for (_name, _labels), values in cls.collect()[1].items():
+            if _name != name or (labels is not None and _labels != labels):
+                continue
+            merged = list(values) if merged is None else [a + b for a, b in zip(merged, values)]
+        if not merged or not sum(merged[:-1]):
+            return None
+        counts = merged[:-1]
+        rank = q * sum(counts)
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = cls.buckets[i - 1] if i else 0.0
+                # Observations above the last bound are reported as the last bound
+                upper = cls.buckets[i] if i < len(cls.buckets) else cls.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return cls.buckets[-1]
+
+    @classmethod
+    def render(cls):
+        """Render all metrics in the Prometheus text exposition format"""
+        counters, histograms = cls.collect()
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), values in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(cls.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append((f"{name}_bucket", labels + (("le", bound),), cumulative))
+            lines.append((f"{name}_sum", labels, values[-1]))
+            lines.append((f"{name}_count", labels, cumulative))
+        for name, callback in cls._gauges.items():
+            try:
+                value = callback()
+            except Exception:
+                continue
+            values = value.items() if isinstance(value, dict) else [((), value)]
+            samples[name] = [(name, labels, float(v)) for labels, v in values]
+
+        output = []
+        for name in sorted(samples):
+            _type, doc = cls._descriptions.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {doc}")
+            output.append(f"# TYPE {name} {_type}")
+            for sample, labels, value in samples[name]:
+                output.append(f"{sample}{cls._format_labels(labels)} {value}")
+        return "\n".join(output) + "\n"
+
+    @classmethod
+    def _shard(cls):
+        shard = getattr(cls._local, "shard", None)
+        if shard is None:
+            shard = cls._local.shard = ({}, {})
+            with cls._lock:
+                cls._shards.append(shard)
+        return shard
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+Metrics.describe("starter_messages_received_total", "counter", "Messages received per consumer topic")
+Metrics.describe("starter_messages_produced_total", "counter", "Messages produced per producer topic")
+Metrics.describe("starter_messages_dropped_total", "counter", "Buffered messages dropped after a failed send per topic")
+Metrics.describe("starter_messages_deduplicated_total", "counter", "Replayed messages skipped per consumer topic")
+Metrics.describe("starter_handler_errors_total", "counter", "Handler errors per consumer topic and handler")
+Metrics.describe("starter_handler_latency_seconds", "histogram", "Handler latency per consumer topic and handler")
+Metrics.describe("starter_produce_latency_seconds", "histogram", "Produce call latency per producer topic")
@@ -0,0 +1,164 @@
+import logging
+import struct
+import threading
+
+from confluent_kafka import Consumer, Producer
+from confluent_kafka.schema_registry import SchemaRegistryClient
+from confluent_kafka.schema_registry.avro import AvroDeserializer
+from confluent_kafka.serialization import MessageField, SerializationContext
+
+_logger = logging.getLogger(__name__)
+
+# Confluent wire format: magic byte 0 followed by the 4 byte schema id
+_WIRE_HEADER = struct.Struct(">bI")
+
+
+class RawMessage:
+    """
+    Message as received from Kafka for passthrough handlers, nothing is decoded until it is used.
+
+    value holds the original value bytes, headers and the decoded message are built on first access. Returning the
+    message from a handler forwards the original bytes to the producer topic when it uses the same schema.
+    """
+    __slots__ = ("value", "topic", "key", "_headers", "_decoded", "_decoder")
+
+    def __init__(self, value=None, topic=None, key=None, headers=None, decoded=None, decoder=None):
+        self.value = value
+        self.topic = topic
+        self.key = key
+        self._headers = headers
+        self._decoded = decoded
+        self._decoder = decoder
+
+    @property
+    def schema_id(self):
+        """Schema id from the wire format header, None when the value is not in the Confluent wire format"""
+        if not self.value or len(self.value) < _WIRE_HEADER.size:
+            return None
+        magic, schema_id = _WIRE_HEADER.unpack_from(self.value)
+        return schema_id if magic == 0 else None
+
+    @property
+    def headers(self) -> dict:
+        if not isinstance(self._headers, dict):
+            self._headers = {key: value for key, value in (self._headers or [])}
+        return self._headers
+
+    def decode(self) -> dict:
+        """Decode the value, the result is kept"""
+        if self._decoded is None and self._decoder is not None:
+            self._decoded = self._decoder(self.value, SerializationContext(self.topic, MessageField.VALUE))
+        return self._decoded
+
+    def __getitem__(self, item):
+        return self.decode()[item]
+
+    def get(self, item, default=None):
+        decoded = self.decode()
+        return decoded.get(item, default) if decoded else default
+
+    def __getstate__(self):
+        # The decoder can not be pickled, e.g. for process workers, the message is decoded before
+        return self.value, self.topic, self.key, self.headers, self.decode()
+
+    def __setstate__(self, state):
+        self.value, self.topic, self.key, self._headers, self._decoded = state
+        self._decoder = None
+
+    def __repr__(self):
+        return f"RawMessage(topic={self.topic}, bytes={len(self.value) if self.value else 0})"
+
+
+def unwrap(response):
+    """Decoded message of a RawMessage response, or of every RawMessage in a list of responses"""
+    if isinstance(response, RawMessage):
+        return response.decode()
+    if isinstance(response, list):
+        return [r.decode() if isinstance(r, RawMessage) else r for r in response]
+    return response
+
+
+def _latest_schema(client, topic):
+    return client.get_latest_version(f"{topic}-value")
+
+
+class RawConsumerManager(threading.Thread):
+    """Consumer that passes RawMessage objects to handle_message instead of decoded dicts"""
+
+    def __init__(self, options, kafka_topic, handle_message):
+        super().__init__()
+        self.daemon = True
+        self.running = True
+        self.options = options
+        self.kafka_topic = kafka_topic
+        self.handle_message = handle_message
+
+        client = SchemaRegistryClient({"url": options.schema_registry})
+        self.schema_str = _latest_schema(client, kafka_topic).schema.schema_str
+        self._decoder = AvroDeserializer(client)
+        self.consumer = Consumer({
+            "bootstrap.servers": options.kafka_host,
+            "group.id": options.consumer_group,
+            "message.max.bytes": options.message_max_bytes,
+            "auto.offset.reset": options.offset_type,
+            "session.timeout.ms": options.session_timeout_ms,
+            "enable.auto.commit": True,
+        })
+        self.consumer.subscribe([kafka_topic])
+
+    def run(self):
+        while self.running:
+            msg = self.consumer.poll(timeout=1)
+            if msg is None:
+                continue
+            if msg.error():
+                _logger.error(f"Kafka error on {self.kafka_topic}: {msg.error()}")
+                continue
+            message = RawMessage(msg.value(), msg.topic(), msg.key(), msg.headers(), decoder=self._decoder)
+            try:
+                self.handle_message(message, self.kafka_topic)
+            except Exception as e:
+                _logger.error(f"Exception occurred: {e}")
+        self.consumer.close()
+
+    def stop(self):
+        self.running = False
+
+    def pause(self):
+        partitions = self.consumer.assignment()
+        if partitions:
+            self.consumer.pause(partitions)
+
+    def resume(self):
+        partitions = self.consumer.assignment()
+        if partitions:
+            self.consumer.resume(partitions)
+
+
+class RawProducerManager:
+    """Producer that sends the original value bytes of RawMessage objects"""
+
+    def __init__(self, options, kafka_topic):
+        self.options = options
+        self.kafka_topic = kafka_topic
+        client = SchemaRegistryClient({"url": options.schema_registry})
+        self.schema_id = _latest_schema(client, kafka_topic).schema_id
+        self.producer = Producer({
+            "bootstrap.servers": options.kafka_host,
+            "message.max.bytes": options.message_max_bytes,
+            "partitioner": options.partitioner,
+        })
+
+    def accepts(self, message: RawMessage):
+        """True when the message is encoded with the schema of this topic and can be forwarded unchanged"""
+        return message.schema_id is not None and message.schema_id == self.schema_id
+
+    def send_messages(self, messages: list):
+        for message in messages:
+            self.producer.produce(self.kafka_topic, value=message.value, key=message.key,
+                                  headers=message.headers or None)
+            self.producer.poll(0)
+        self.producer.flush()
+
+    def stop(self):
+        self.producer.flush()
@@ -1,21 +1,35 @@
+import hashlib
+import importlib.util
 import json
 import logging
+import shutil
+import threading
 from pathlib import Path
 from pydoc import locate
 
-from starter_service.avro_parser import avsc_to_pydantic
+from starter_service.avro_parser import TARGETS, avsc_to_code, avsc_to_model
+from starter_service.env import ENV
+from starter_service.validator import compile_validator
 
 _logger = logging.getLogger(__name__)
 
+# Bump when avsc_to_code output changes, so cached classes are regenerated
+_CODEGEN_VERSION = "1"
+
 
 class Schema:
 
-    def __init__(self, topic=None, filename=None, class_name=None, class_obj=None, full_path=None):
+    def __init__(self, topic=None, filename=None, class_name=None, class_obj=None, full_path=None, schema_hash=None,
+                 source=None, avro=None):
         self.topic = topic
         self.filename = filename
         self.class_name = class_name
         self.class_obj = class_obj
         self.full_path = full_path
+        self.schema_hash = schema_hash
+        self.source = source
+        self.avro = avro
+        self.validator = None
 
     def __str__(self):
         return f"{self.class_name} from {self.filename}"
@@ -25,41 +39,93 @@ class Schema:
 
 
 class SchemaRegistry:
+    """
+    Registry of the classes generated from the AVRO schemas of the topics.
+
+    Schemas can be registered from several threads at the same time. Registrations of the same topic or of the same
+    schema are serialized, so a class is generated and its file is written only once.
+
+    Classes are pydantic models by default. A topic can use __slots__ dataclasses or msgspec Structs instead (see
+    TARGETS), set with SCHEMA_TARGET, SCHEMA_TARGETS or set_target before its schema is registered.
+    """
     _logger = logging.getLogger(__name__)
     _pathlib_path = None
     _schemas = {}
+    # Generated classes by schema hash
+    _cache = {}
+    # Guards _schemas, _cache and _locks
+    _lock = threading.RLock()
+    # Locks by topic and by schema hash
+    _locks = {}
+    # pydoc.locate reloads modules, which is not safe from several threads
+    _import_lock = threading.Lock()
+    # Codegen targets by topic, set with set_target
+    _targets = {}
+    # Incremented whenever a topic schema changes, e.g. to invalidate documents that list the schemas
+    version = 0
 
     @classmethod
     def get_schemas(cls):
         return cls._schemas
 
+    @classmethod
+    def _lock_for(cls, key):
+        with cls._lock:
+            return cls._locks.setdefault(key, threading.RLock())
+
+    @classmethod
+    def set_target(cls, topic, target):
+        """Generate the classes of a topic for a target of TARGETS, only applies to schemas registered afterwards"""
+        cls._check_target(target)
+        cls._targets[topic] = target
+
+    @staticmethod
+    def _check_target(target):
+        """Raise when a codegen target is unknown or its package is not installed"""
+        if target not in TARGETS:
+            raise ValueError(f"Unsupported target {target}, use one of {TARGETS}")
+        if target == "msgspec" and importlib.util.find_spec("msgspec") is None:
+            raise ImportError("Schema target msgspec needs the msgspec package, "
+                              "install it with `pip install osint-python-starter-service[msgspec]`")
+
+    @classmethod
+    def get_target(cls, topic):
+        return cls._targets.get(topic) or ENV.SCHEMA_TARGETS.get(topic) or ENV.SCHEMA_TARGET
+
     @classmethod
     def get_schemas_dict(cls):
-        return {schema.topic: schema.class_name for class_name, schema in cls._schemas.items()}
+        return {schema.topic: schema.class_name for class_name, schema in cls._schemas.copy().items()}
 
     @classmethod
     def initialize(cls, path=None):
         cls._pathlib_path = Path(path) if path else Path().absolute()
         cls._logger.info(f"Initializing SchemaRegistry {cls._pathlib_path}")
+        # Fail on start instead of on the first schema of a topic
+        for target in {ENV.SCHEMA_TARGET, *ENV.SCHEMA_TARGETS.values()}:
+            cls._check_target(target)
         # create schema folder if not exists
         cls._init_dir()
         # load schemas from folder
         cls._load_local_schemas()
-        # load classes from folder
-        cls._load_local_classes()
+        # load classes from folder, generated classes are kept in memory only when SCHEMA_IN_MEMORY is set
+        if not ENV.SCHEMA_IN_MEMORY:
+            cls._load_local_classes()
 
     @classmethod
     def _load_local_schemas(cls):
         # load avro schemas from local folder
         _schemas = []
         try:
-            if not cls._pathlib_path.exists():
+            if not cls._pathlib_path.exists() and not cls._read_only():
                 cls._pathlib_path.mkdir()
         except Exception as e:
             cls._logger.error(f"Error creating schema folder: {e}")
             return
 
         schemas_dir = cls._pathlib_path / "schemas"
+        if not schemas_dir.exists():
+            cls._logger.warning(f"Schema folder {schemas_dir} does not exist")
+            return
         for file in schemas_dir.iterdir():
             if file.suffix == ".avsc" or file.suffix == "-value.avsc" or file.suffix == "-key.avsc":
                 _schemas.append(file)
@@ -81,44 +147,122 @@ class SchemaRegistry:
                     continue
                 cls._logger.info(f"Loading class {topic} from file {file}")
                 main_class = cls._read_main_class_from_file(file.name)
-                schema = Schema(topic, file, main_class, cls._load_class_from_file(f'{topic}.py', main_class), file)
+                schema_hash = cls._read_schema_hash_from_file(file.name)
+                schema = Schema(topic, file, main_class, cls._load_class_from_file(f'{topic}.py', main_class), file,
+                                schema_hash)
                 cls._schemas[topic] = schema
+                cls.version += 1
+                if schema_hash and schema.class_obj:
+                    cls._cache.setdefault(schema_hash, schema)
 
     @classmethod
     def _read_main_class_from_file(cls, file):
-        main_class = None
         _logger.info(f"Reading main class from file {file}")
+        main_class = cls._read_module_attr(file, "main_class")
+        _logger.info(f"Main class is {main_class}")
+        return main_class
+
+    @classmethod
+    def _read_schema_hash_from_file(cls, file):
+        if not (cls._pathlib_path / "classes" / file).exists():
+            return None
+        schema_hash = cls._read_module_attr(file, "schema_hash")
+        return schema_hash.strip('"') if schema_hash else None
+
+    @classmethod
+    def _read_module_attr(cls, file, name):
+        """Read a top level `name = value` assignment from a generated class file"""
         file_path = cls._pathlib_path / "classes" / file
         if not file_path.exists():
             _logger.error(f"File {file_path} does not exist")
             return None
         with open(file_path, "r") as f:
             for line in f.readlines():
-                if line.startswith("main_class"):
-                    main_class = line.split(" ")[2].strip()
-                    break
-            _logger.info(f"Main class is {main_class}")
-        return main_class
+                if line.startswith(f"{name} = "):
+                    return line.split(" ")[2].strip()
+        return None
+
+    @staticmethod
+    def schema_hash(schema: [str, dict], target: str = "pydantic") -> str:
+        """Hash of the canonical form of an AVRO schema and the codegen target"""
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+        # Hashes of pydantic classes are unchanged, so their existing files are still reused
+        key = f"{_CODEGEN_VERSION}:{canonical}" if target == "pydantic" else f"{_CODEGEN_VERSION}:{target}:{canonical}"
+        return hashlib.sha256(key.encode()).hexdigest()
 
     @classmethod
     def register_schema(cls, schema: [str, dict], topic: str):
         """
-        Register a schema from a string or dict
+        Register a schema from a string or dict. Code generation, file writes and imports are skipped when a class
+        for the same schema was generated before.
         :param schema: AVRO string schema
         :param topic: topic to register the schema for
         :param _type: SchemaType Enum (consume or produce)
         :return:
         """
         cls._logger.info(f"Registering schema for topic {topic}")
-        filename, main_class, python_classes = cls._avro_to_file(schema)
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        target = cls.get_target(topic)
+        schema_hash = cls.schema_hash(schema, target)
+        # The topic lock is always taken before the hash lock
+        with cls._lock_for(("topic", topic)), cls._lock_for(("hash", schema_hash)):
+            cls._register_schema(schema, topic, schema_hash, target)
 
+    @classmethod
+    def _register_schema(cls, schema: dict, topic: str, schema_hash: str, target: str = "pydantic"):
         full_path = cls._pathlib_path / "classes" / f'{topic}.py'
-        cls._logger.info(f"Writing schema to file {full_path}, path {cls._pathlib_path}")
-        with open(full_path, "w") as f:
-            f.write(python_classes)
-        schema = Schema(topic, filename, main_class, cls._load_class_from_file(f'{topic}.py', main_class), full_path)
+
+        cached = cls._cache.get(schema_hash)
+        if cached is None and not ENV.SCHEMA_IN_MEMORY \
+                and cls._read_schema_hash_from_file(f'{topic}.py') == schema_hash:
+            cls._logger.info(f"Schema for topic {topic} unchanged, loading class from file {full_path}")
+            main_class = cls._read_main_class_from_file(f'{topic}.py')
+            cached = Schema(topic, f"{schema['name'].lower()}.py", main_class,
+                            cls._load_class_from_file(f'{topic}.py', main_class), full_path, schema_hash)
+        if cached is None:
+            if ENV.SCHEMA_IN_MEMORY:
+                python_classes = None
+                if ENV.SCHEMA_EXPORT_CLASSES:
+                    python_classes = cls._avro_to_file(schema, target)[2]
+                    cls._write_class_file(full_path, python_classes, schema_hash)
+                cached = Schema(topic, f"{schema['name'].lower()}.py", schema['name'], avsc_to_model(schema, target),
+                                None, schema_hash, python_classes)
+            else:
+                filename, main_class, python_classes = cls._avro_to_file(schema, target)
+                cls._write_class_file(full_path, python_classes, schema_hash)
+                cached = Schema(topic, filename, main_class, cls._load_class_from_file(f'{topic}.py', main_class),
+                                full_path, schema_hash)
+        elif (not ENV.SCHEMA_IN_MEMORY or ENV.SCHEMA_EXPORT_CLASSES) and cached.full_path != full_path \
+                and cls._read_schema_hash_from_file(f'{topic}.py') != schema_hash:
+            # Same schema is used by another topic, export its file for this topic as well
+            if cached.source:
+                cls._write_class_file(full_path, cached.source, schema_hash)
+            else:
+                shutil.copyfile(cached.full_path, full_path)
+        with cls._lock:
+            cls._cache.setdefault(schema_hash, cached)
+
+        schema = Schema(topic, cached.filename, cached.class_name, cached.class_obj, full_path, schema_hash,
+                        avro=schema)
         _logger.info(f"Registering schema {schema.__dict__} for topic {topic}")
-        cls._schemas[topic] = schema
+        with cls._lock:
+            cls._schemas[topic] = schema
+            cls.version += 1
+
+    @classmethod
+    def _write_class_file(cls, full_path, python_classes, schema_hash):
+        cls._logger.info(f"Writing schema to file {full_path}, path {cls._pathlib_path}")
+        try:
+            with open(full_path, "w") as f:
+                f.write(python_classes)
+                f.write(f'schema_hash = "{schema_hash}"\n')
+        except Exception as e:
+            if not ENV.SCHEMA_IN_MEMORY:
+                raise e
+            cls._logger.error(f"Could not export classes to {full_path}: {e}")
 
     @classmethod
     def _load_class_from_file(cls, filename, class_name):
@@ -126,12 +270,14 @@ class SchemaRegistry:
         path = str(cls._pathlib_path).replace(absolute, "").replace("/", ".")
         cls._logger.info(
             f"Loading class from file {filename} with class {class_name}, path {path}.classes.{filename[:-3]}.{class_name}")
-        return locate(f"{path}.classes.{filename[:-3]}.{class_name}", True)
+        with cls._import_lock:
+            return locate(f"{path}.classes.{filename[:-3]}.{class_name}", True)
 
     @classmethod
-    def _avro_to_file(cls, schema: [str, dict]) -> [str, str, str]:
+    def _avro_to_file(cls, schema: [str, dict], target: str = "pydantic") -> [str, str, str]:
         """
         :param schema: AVRO schema as string or dict
+        :param target: codegen target, one of TARGETS
         :return: filename, main_class, python_classes
         """
         if isinstance(schema, str):
@@ -139,7 +285,7 @@ class SchemaRegistry:
         class_name = schema['name']
         if class_name is None:
             raise ValueError(f"Schema {schema[:20]} does not contain a name")
-        python_classes, main_class = avsc_to_pydantic(schema)
+        python_classes, main_class = avsc_to_code(schema, target)
         filename = f"{class_name.lower()}.py"
         return filename, main_class, python_classes
 
@@ -162,8 +308,15 @@ class SchemaRegistry:
         if filename.endswith(".avsc"):
             return filename[:-5].lower()
 
+    @classmethod
+    def _read_only(cls):
+        """Nothing is written when classes are kept in memory only, the folders may be on a read-only filesystem"""
+        return ENV.SCHEMA_IN_MEMORY and not ENV.SCHEMA_EXPORT_CLASSES
+
     @classmethod
     def _init_dir(cls):
+        if cls._read_only():
+            return
         try:
             if not cls._pathlib_path.exists():
                 cls._pathlib_path.mkdir(parents=True, exist_ok=True)
@@ -180,7 +333,8 @@ class SchemaRegistry:
                 readme_file.write_text("This folder contains all the generated classes from the schemas")
             except Exception as e:
                 cls._logger.error(f"Error creating classes folder {e}")
-                raise e
+                if not ENV.SCHEMA_IN_MEMORY:
+                    raise e
 
         schemas_dir = cls._pathlib_path / "schemas"
         if not schemas_dir.exists():
@@ -190,7 +344,8 @@ class SchemaRegistry:
                 readme_file.write_text("Use this folder to provide AVRO schemas")
             except Exception as e:
                 cls._logger.error(f"Error creating schema folder {e}")
-                raise e
+                if not ENV.SCHEMA_IN_MEMORY:
+                    raise e
 
     @classmethod
     def get_schema(cls, topic) -> object or dict:
@@ -199,3 +354,13 @@ class SchemaRegistry:
         if topic not in cls._schemas.keys():
             return dict
         return cls._schemas[topic].class_obj
+
+    @classmethod
+    def get_validator(cls, topic):
+        """Return a compiled validator for the AVRO schema of a topic, None if the schema is not known"""
+        schema = cls._schemas.get(topic) if topic else None
+        if schema is None or schema.avro is None:
+            return None
+        if schema.validator is None:
+            schema.validator = compile_validator(schema.avro)
+        return schema.validator
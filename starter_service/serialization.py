@@ -0,0 +1,95 @@
+import json
+import logging
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from starter_service.env import ENV
+from starter_service.raw_kafka import RawMessage
+
+_logger = logging.getLogger(__name__)
+
+ENGINES = ["auto", "orjson", "msgspec", "json"]
+
+
+def _default(value):
+    """Encode values the engines do not support natively"""
+    if isinstance(value, RawMessage):
+        return value.decode()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "__struct_fields__"):
+        import msgspec
+        return msgspec.to_builtins(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    try:
+        return jsonable_encoder(value)
+    except ValueError:
+        return str(value)
+
+
+def _orjson():
+    import orjson
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    return lambda value: orjson.dumps(value, default=_default, option=option)
+
+
+def _msgspec():
+    import msgspec
+    return msgspec.json.Encoder(enc_hook=_default).encode
+
+
+def _json():
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+    return lambda value: encoder.encode(value).encode()
+
+
+_LOADERS = {"orjson": _orjson, "msgspec": _msgspec, "json": _json}
+
+
+def load_engine(name):
+    """
+    Return (name, dumps) of a serialization engine, auto picks the first installed of orjson, msgspec and json. An
+    engine that was asked for by name and is not installed raises ImportError.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unsupported serializer {name}, use one of {ENGINES}")
+    if name != "auto":
+        try:
+            return name, _LOADERS[name]()
+        except ImportError:
+            raise ImportError(f"Serializer {name} is not installed, install it with "
+                              f"`pip install osint-python-starter-service[{name}]` or use SERIALIZER=auto")
+    for candidate in ["orjson", "msgspec"]:
+        try:
+            return candidate, _LOADERS[candidate]()
+        except ImportError:
+            pass
+    return "json", _json()
+
+
+# Serialize a value to JSON bytes with the configured engine. Encoder methods are used as they are, without a wrapper
+engine, dumps = load_engine(ENV.SERIALIZER)
+_logger.info(f"Serializing JSON with {engine}")
+
+
+class Serialized:
+    """Lazy JSON string of a payload for log arguments, only serialized when the record is emitted"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        try:
+            return dumps(self.value).decode()
+        except Exception:
+            return repr(self.value)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized with the configured engine"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
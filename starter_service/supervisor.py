@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from time import monotonic, sleep, time
+
+from starter_service.env import ENV
+
+_logger = logging.getLogger(__name__)
+
+
+class Supervisor:
+    """
+    Runs a service in SERVICE_WORKERS forked processes and restarts workers that crash or stop sending heartbeats.
+
+    Workers join the same consumer group, so Kafka spreads the partitions across them, and bind the REST port with
+    SO_REUSEPORT, so the kernel spreads connections across them. Every worker writes a heartbeat with its ready() and
+    health() results to shared memory, status() returns them for all workers.
+    """
+    # Shared between the supervisor and its workers: pid, heartbeat, ready, healthy per worker
+    _FIELDS = 4
+    _status = None
+    worker_index = None
+
+    def __init__(self, service, workers=None):
+        self.service = service
+        self.workers = workers or ENV.SERVICE_WORKERS
+        self.running = False
+        self._context = multiprocessing.get_context("fork")
+        self._processes = {}
+        self._started = {}
+
+    @classmethod
+    def is_worker(cls):
+        return cls.worker_index is not None
+
+    @classmethod
+    def status(cls):
+        """Return the status of every worker, None when the service does not run under a supervisor"""
+        if cls._status is None:
+            return None
+        now = time()
+        workers = []
+        for i in range(len(cls._status) // cls._FIELDS):
+            pid, heartbeat, ready, healthy = cls._status[i * cls._FIELDS:(i + 1) * cls._FIELDS]
+            workers.append({
+                "worker": i,
+                "pid": int(pid),
+                "alive": bool(heartbeat) and now - heartbeat < ENV.SERVICE_HEARTBEAT_TIMEOUT_S,
+                "last_heartbeat_s": round(now - heartbeat, 3) if heartbeat else None,
+                "ready": bool(ready),
+                "healthy": bool(healthy),
+            })
+        return workers
+
+    def run(self):
+        """Start the workers and watch them until the supervisor receives SIGTERM or SIGINT"""
+        Supervisor._status = self._context.Array("d", self.workers * self._FIELDS, lock=False)
+        self.running = True
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        _logger.info(f"Starting {self.workers} workers")
+        for i in range(self.workers):
+            self._start_worker(i)
+        while self.running:
+            for i, process in list(self._processes.items()):
+                if not process.is_alive():
+                    _logger.error(f"Worker {i} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                    self._restart_worker(i)
+                elif self._stale(i):
+                    _logger.error(f"Worker {i} (pid {process.pid}) stopped sending heartbeats, restarting")
+                    self._stop_process(process)
+                    self._restart_worker(i)
+            sleep(1)
+        self.stop()
+
+    def stop(self):
+        """Stop all workers, they get SERVICE_STOP_TIMEOUT_S to finish before they are killed"""
+        self.running = False
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = monotonic() + ENV.SERVICE_STOP_TIMEOUT_S
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - monotonic()))
+            if process.is_alive():
+                _logger.warning(f"Worker pid {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+        self._processes = {}
+
+    def _on_signal(self, signum, frame):
+        _logger.info(f"Received signal {signum}, stopping workers")
+        self.running = False
+
+    def _start_worker(self, i):
+        self._status[i * self._FIELDS:(i + 1) * self._FIELDS] = [0.0] * self._FIELDS
+        process = self._context.Process(target=self._run_worker, args=(i,), name=f"Worker-{i}", daemon=False)
+        process.start()
+        self._processes[i] = process
+        self._started[i] = monotonic()
+        _logger.info(f"Worker {i} started with pid {process.pid}")
+
+    def _restart_worker(self, i):
+        process = self._processes[i]
+        # Avoid a tight restart loop when a worker crashes on start
+        if monotonic() - self._started[i] < ENV.SERVICE_RESTART_DELAY_S:
+            sleep(ENV.SERVICE_RESTART_DELAY_S)
+        process.join(0)
+        if self.running:
+            self._start_worker(i)
+
+    def _stale(self, i):
+        heartbeat = self._status[i * self._FIELDS + 1]
+        if heartbeat:
+            return time() - heartbeat > ENV.SERVICE_HEARTBEAT_TIMEOUT_S
+        # No heartbeat yet, the worker is still starting
+        return monotonic() - self._started[i] > ENV.SERVICE_HEARTBEAT_TIMEOUT_S + ENV.SERVICE_START_TIMEOUT_S
+
+    @staticmethod
+    def _stop_process(process):
+        process.terminate()
+        process.join(ENV.SERVICE_STOP_TIMEOUT_S)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _run_worker(self, i):
+        """Entry point of a forked worker"""
+        Supervisor.worker_index = i
+        ENV.REST_API_REUSE_PORT = True
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        threading.Thread(target=self._heartbeat, args=(i, stopped), name="Heartbeat", daemon=True).start()
+
+        service = self.service
+        service.logger.info(f"Worker {i} running with pid {os.getpid()}")
+        # Blocks while the API server runs, uvicorn handles SIGTERM itself then
+        service.start()
+        if not service.api:
+            stopped.wait()
+        service.stop()
+
+    def _heartbeat(self, i, stopped):
+        offset = i * self._FIELDS
+        while not stopped.is_set():
+            ready = healthy = False
+            try:
+                ready = bool(self.service.ready())
+                healthy = bool(self.service.health())
+            except Exception as e:
+                _logger.error(f"Worker {i} status check failed: {e}")
+            self._status[offset:offset + self._FIELDS] = [os.getpid(), time(), ready, healthy]
+            stopped.wait(ENV.SERVICE_HEARTBEAT_INTERVAL_S)
@@ -0,0 +1,187 @@
+from copy import deepcopy
+from typing import Callable, Union
+
+
+class MessageValidationError(ValueError):
+    """Message does not match its AVRO schema"""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+        self.path = []
+
+    def at(self, segment):
+        """Prepend a path segment while the error propagates out of nested values"""
+        self.path.insert(0, str(segment))
+        return self
+
+    def __str__(self):
+        return f"{'.'.join(self.path)}: {self.detail}" if self.path else self.detail
+
+
+_NUMBER = (int, float)
+
+# Accepted python types of AVRO primitive and logical types in JSON messages
+_TYPES = {
+    "string": (str,),
+    "bytes": (str, bytes),
+    "int": (int,),
+    "long": (int,),
+    "float": _NUMBER,
+    "double": _NUMBER,
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+_LOGICAL_TYPES = {
+    "uuid": (str,),
+    "decimal": (int, float, str),
+    "date": (int, str),
+    "time-millis": (int, str),
+    "time-micros": (int, str),
+    "timestamp-millis": (int, str),
+    "timestamp-micros": (int, str),
+}
+
+
+def compile_validator(schema: dict) -> Callable[[dict], dict]:
+    """
+    Compile an AVRO schema into a function that validates a message dict in place and returns it. Missing fields
+    that have a default are filled in, MessageValidationError is raised for invalid messages.
+    """
+    named = {}
+    validate = _compile(schema, named)
+
+    def validator(message):
+        try:
+            validate(message)
+        except MessageValidationError as e:
+            raise e.at("message")
+        return message
+
+    return validator
+
+
+def _compile(t: Union[str, list, dict], named: dict):
+    if isinstance(t, str):
+        if t in _TYPES:
+            return _instance_check(t, _TYPES[t])
+        return _named_type(t, named)
+    if isinstance(t, list):
+        return _union(t, named)
+
+    logical_type = t.get("logicalType")
+    if logical_type in _LOGICAL_TYPES:
+        return _instance_check(logical_type, _LOGICAL_TYPES[logical_type])
+    _type = t.get("type")
+    if _type == "record":
+        return _record(t, named)
+    if _type == "enum":
+        return _enum(t, named)
+    if _type == "array":
+        return _array(t, named)
+    if _type == "map":
+        return _map(t, named)
+    if _type == "fixed":
+        return _instance_check("fixed", _TYPES["bytes"])
+    if isinstance(_type, (str, list)):
+        return _compile(_type, named)
+    raise NotImplementedError(f"Type {t} not supported yet")
+
+
+def _instance_check(name, types):
+    strict_number = bool not in types
+
+    def check(value):
+        if not isinstance(value, types) or (strict_number and isinstance(value, bool)):
+            raise MessageValidationError(f"expected {name}, got {type(value).__name__}")
+
+    return check
+
+
+def _named_type(name, named):
+    def check(value):
+        if name not in named:
+            raise MessageValidationError(f"unknown type {name}")
+        named[name](value)
+
+    return check
+
+
+def _union(types, named):
+    checks = [_compile(t, named) for t in types]
+
+    def check(value):
+        for _check in checks:
+            try:
+                _check(value)
+                return
+            except MessageValidationError:
+                continue
+        raise MessageValidationError(f"does not match any of {types}")
+
+    return check
+
+
+def _record(t, named):
+    fields = []
+
+    def check(value):
+        if not isinstance(value, dict):
+            raise MessageValidationError(f"expected record {t['name']}, got {type(value).__name__}")
+        for name, _check, has_default, default in fields:
+            if name in value:
+                try:
+                    _check(value[name])
+                except MessageValidationError as e:
+                    raise e.at(name)
+            elif has_default:
+                value[name] = deepcopy(default) if isinstance(default, (list, dict)) else default
+            else:
+                raise MessageValidationError("field required").at(name)
+
+    # Registered before the fields are compiled, so records can refer to themselves
+    named[t["name"]] = check
+    for field in t["fields"]:
+        fields.append((field["name"], _compile(field["type"], named), "default" in field, field.get("default")))
+    return check
+
+
+def _enum(t, named):
+    symbols = frozenset(t["symbols"])
+
+    def check(value):
+        if not isinstance(value, str) or value not in symbols:
+            raise MessageValidationError(f"{value!r} is not one of {t['symbols']}")
+
+    named[t["name"]] = check
+    return check
+
+
+def _array(t, named):
+    items = _compile(t["items"], named)
+
+    def check(value):
+        if not isinstance(value, list):
+            raise MessageValidationError(f"expected array, got {type(value).__name__}")
+        for i, item in enumerate(value):
+            try:
+                items(item)
+            except MessageValidationError as e:
+                raise e.at(i)
+
+    return check
+
+
+def _map(t, named):
+    values = _compile(t["values"], named)
+
+    def check(value):
+        if not isinstance(value, dict):
+            raise MessageValidationError(f"expected map, got {type(value).__name__}")
+        for key, item in value.items():
+            try:
+                values(item)
+            except MessageValidationError as e:
+                raise e.at(key)
+
+    return check
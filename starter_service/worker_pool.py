@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+
+_logger = logging.getLogger(__name__)
+
+# Service instance used by handlers running in forked worker processes
+_service = None
+
+
+def call_handler(func, service, message):
+    """Call a handler from synchronous code, coroutine handlers are run to completion"""
+    response = func(service, message)
+    if asyncio.iscoroutine(response):
+        return asyncio.run(response)
+    return response
+
+
+def _call_in_process(func, message, uncached=False):
+    """Run a handler inside a worker process, memoized handlers are called without their cache with uncached"""
+    return call_handler(func.uncached if uncached else func, _service, message)
+
+
+class WorkerPoolFull(Exception):
+    """Worker pool has queue_size tasks queued or running"""
+
+
+class WorkerPool:
+    """
+    Pool of worker lanes that run message handlers off the consumer thread.
+
+    Every lane is a thread with its own queue. Messages that share a key always end up on the same lane, so their
+    order is kept; messages without a key are spread round-robin. In process mode the lanes hand the handler call
+    over to a process pool, so CPU-bound handlers can use more than one core.
+
+    In async mode tasks are coroutines scheduled on one event loop thread, so many I/O-bound handlers can wait at
+    the same time. Lanes are locks there, tasks with the same key still run one after another.
+
+    Submitting never blocks the caller, which is usually a Kafka consumer thread that has to keep polling. Once
+    queue_size tasks are in flight on_full is called, so the caller can stop pulling work (the KafkaAdapter pauses
+    its consumers), and on_drain once the pool is half empty again.
+    """
+    MODES = ["thread", "process", "async"]
+
+    def __init__(self, mode="thread", workers=4, queue_size=100, service=None, on_full=None, on_drain=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported worker mode {mode}, use one of {self.MODES}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.running = False
+
+        self._service = service
+        self._on_full = on_full
+        self._on_drain = on_drain
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._full = False
+        # Serializes on_full and on_drain, see _notify
+        self._notify_lock = threading.Lock()
+        self._notified_full = False
+        self._next_lane = 0
+        self._lanes = []
+        self._threads = []
+        self._executor = None
+        self._loop = None
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def is_async(self):
+        return self.mode == "async"
+
+    def start(self):
+        """Start worker lanes, the process pool in process mode and the event loop in async mode"""
+        global _service
+        if self.mode == "process":
+            # Worker processes are forked, so they inherit the service instance
+            _service = self._service
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("fork"))
+        if self.is_async:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="WorkerLoop", daemon=True).start()
+            self._lanes = [asyncio.Lock() for _ in range(self.workers)]
+            self.running = True
+            _logger.info(f"Worker pool started: mode {self.mode}, queue size {self.queue_size}")
+            return
+        for i in range(self.workers):
+            queue = Queue()
+            thread = threading.Thread(target=self._run_lane, args=(queue,), name=f"WorkerLane-{i}", daemon=True)
+            thread.start()
+            self._lanes.append(queue)
+            self._threads.append(thread)
+        self.running = True
+        _logger.info(f"Worker pool started: mode {self.mode}, workers {self.workers}, queue size {self.queue_size}")
+
+    def stop(self):
+        """Let the lanes finish queued work and stop them, returns once every queued task ran"""
+        with self._condition:
+            self.running = False
+        if self._loop:
+            with self._condition:
+                while self._in_flight:
+                    self._condition.wait()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        else:
+            for queue in self._lanes:
+                queue.put(None)
+            # The lanes still need the process pool for the tasks queued before the sentinel
+            for thread in self._threads:
+                thread.join()
+        self._lanes, self._threads = [], []
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, key, fn, *args, reject=False):
+        """
+        Queue fn(*args) on a worker lane, fn must be a coroutine function in async mode. Messages the consumer
+        fetched before it was paused are still queued above queue_size.
+        :param key: ordering key, tasks with the same key run in submission order
+        :param reject: raise WorkerPoolFull instead of queueing above queue_size
+        """
+        with self._condition:
+            if not self.running:
+                raise RuntimeError("Worker pool is stopped")
+            if reject and self._in_flight >= self.queue_size:
+                raise WorkerPoolFull(f"{self._in_flight} tasks are queued or running")
+            self._in_flight += 1
+            full = not self._full and self._in_flight >= self.queue_size
+            if full:
+                self._full = True
+            if key is None:
+                lane = self._next_lane
+                self._next_lane = (self._next_lane + 1) % self.workers
+            else:
+                lane = hash(key) % self.workers
+        if full:
+            self._notify()
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._run_async(None if key is None else lane, fn, args), self._loop)
+        else:
+            self._lanes[lane].put((fn, args))
+
+    def execute(self, func, message):
+        """Call a handler, in a worker process when running in process mode"""
+        if self._executor:
+            cached = getattr(func, "cached", None)
+            if cached is not None:
+                # Looked up here, the worker processes only see cache misses
+                return cached(message, lambda m: self._executor.submit(_call_in_process, func, m, True).result())
+            return self._executor.submit(_call_in_process, func, message).result()
+        return call_handler(func, self._service, message)
+
+    async def execute_async(self, func, message):
+        """Await a handler, synchronous handlers run in the default executor"""
+        if asyncio.iscoroutinefunction(func):
+            return await func(self._service, message)
+        return await asyncio.get_running_loop().run_in_executor(None, func, self._service, message)
+
+    async def _run_async(self, lane, fn, args):
+        try:
+            if lane is None:
+                await fn(*args)
+            else:
+                async with self._lanes[lane]:
+                    await fn(*args)
+        except Exception as e:
+            _logger.error(f"Worker task failed: {e}")
+        finally:
+            self._task_done()
+
+    def _run_lane(self, queue):
+        while True:
+            task = queue.get()
+            if task is None:
+                break
+            fn, args = task
+            try:
+                fn(*args)
+            except Exception as e:
+                _logger.error(f"Worker task failed: {e}")
+            finally:
+                self._task_done()
+
+    def _task_done(self):
+        with self._condition:
+            self._in_flight -= 1
+            drained = self._full and self._in_flight <= self.queue_size // 2
+            if drained:
+                self._full = False
+            self._condition.notify_all()
+        if drained:
+            self._notify()
+
+    def _notify(self):
+        """
+        Call on_full or on_drain for the current state. The callbacks run outside the condition, so a drain could
+        otherwise overtake the full call before it and leave the caller paused on an empty pool.
+        """
+        with self._notify_lock:
+            full = self._full
+            if full == self._notified_full:
+                return
+            self._notified_full = full
+            callback = self._on_full if full else self._on_drain
+            if callback:
+                callback()
@@ -0,0 +1,84 @@
+import os
+import time
+
+# ENV reads the environment when it is imported, so this has to run before starter_service is imported
+os.environ.setdefault("KAFKA_BACKEND", "local")
+os.environ.setdefault("CLIENT_ID", "tests")
+os.environ.setdefault("SCHEMA_IN_MEMORY", "true")
+os.environ.setdefault("SCHEMA_EXPORT_CLASSES", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest
+
+from starter_service.api import API
+from starter_service.env import ENV
+from starter_service.local_kafka import LocalBroker
+from starter_service.metrics import Metrics
+from starter_service.schemas import SchemaRegistry
+
+
+class Service:
+    """Stand-in for StarterService with what KafkaAdapter and APIServer use"""
+    logger = None
+    kafka = None
+
+    def ready(self):
+        return True
+
+    def health(self):
+        return "OK"
+
+    def stop(self):
+        pass
+
+
+def wait_for(condition, timeout=5):
+    """Wait until condition() is true, returns its last result"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def counter(name, *labels):
+    """Current value of a counter, labels are (name, value) pairs"""
+    return Metrics.collect()[0].get((name, tuple(labels)), 0)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(tmp_path):
+    """Routes, local topics and schemas are global, every test starts without them"""
+    API.reset()
+    LocalBroker.reset()
+    SchemaRegistry._schemas = {}
+    SchemaRegistry._cache = {}
+    SchemaRegistry._targets = {}
+    SchemaRegistry.initialize(tmp_path)
+    yield
+    API.reset()
+    LocalBroker.reset()
+
+
+@pytest.fixture
+def start_adapter(monkeypatch):
+    """Start a KafkaAdapter on the local broker, returns a function that takes the topics and ENV overrides"""
+    from starter_service.kafka_adapter import KafkaAdapter
+    adapters = []
+
+    def start(consume="", produce="", **env):
+        monkeypatch.setattr(ENV, "CONSUME", consume)
+        monkeypatch.setattr(ENV, "PRODUCE", produce)
+        for name, value in env.items():
+            monkeypatch.setattr(ENV, name, value)
+        adapter = KafkaAdapter()
+        adapter.base_service = Service()
+        adapter.base_service.kafka = adapter
+        adapter.start()
+        adapters.append(adapter)
+        assert adapter.consumers_started.wait(5), adapter.error_msg
+        return adapter
+
+    yield start
+    for adapter in adapters:
+        adapter.stop()
+        adapter.join(5)
@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from starter_service.api import API
+from starter_service.api_server import APIServer
+from starter_service.env import ENV
+from starter_service.local_kafka import LocalBroker
+from starter_service.schemas import SchemaRegistry
+from tests.conftest import Service, wait_for
+
+SCHEMA = {"type": "record", "name": "Item", "fields": [{"name": "id", "type": "string"}]}
+
+
+def register_schema(topic):
+    """Register a schema like a running service, the KafkaAdapter registers it again from the local broker"""
+    LocalBroker.register_schema(topic, SCHEMA)
+    SchemaRegistry.register_schema(SCHEMA, topic)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Build an APIServer for the registered routes, returns a function that takes ENV overrides and a kafka adapter"""
+
+    def create(kafka=None, **env):
+        for name, value in env.items():
+            monkeypatch.setattr(ENV, name, value)
+        server = APIServer(name="tests", ready=lambda: True, health=lambda: "OK")
+        server.base_service = Service()
+        server.base_service.kafka = kafka
+        server._register_static_routes()
+        for route in API.functions:
+            server._register_route(route)
+        server.fast_api.include_router(server.router)
+        return TestClient(server.fast_api)
+
+    return create
+
+
+@pytest.fixture
+def routes():
+    register_schema("in")
+    register_schema("out")
+
+    @API.post(consumer="in", producer="out")
+    def handler(service, message):
+        if message["id"] == "fail":
+            raise ValueError("boom")
+        return {"id": message["id"].upper()}
+
+
+def test_bulk_and_jobs_are_disabled_by_default(routes, client):
+    paths = client().get("/openapi.json").json()["paths"]
+    assert "/api/in/out" in paths
+    assert not [path for path in paths if path.endswith("/bulk") or "/jobs" in path]
+
+
+def test_bulk(routes, client):
+    client = client(REST_BULK_ENABLED=True)
+    body = "\n".join(json.dumps({"id": id}) for id in ["a", "fail", "b"])
+    response = client.post("/api/in/out/bulk?parallel=2", content=body)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"index": 0, "response": {"id": "A"}}
+    assert lines[1]["index"] == 1 and "boom" in lines[1]["error"]
+    assert lines[2] == {"index": 2, "response": {"id": "B"}}
+
+    response = client.post("/api/in/out/bulk", content=json.dumps([{"id": "c"}, {"missing": "id"}]))
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["response"] == {"id": "C"} and "error" in lines[1]
+
+
+def test_batch_bulk(client):
+    register_schema("in")
+
+    @API.post(consumer="in", batch=True, batch_size=2)
+    def handler(service, messages):
+        return [len(messages)] * len(messages)
+
+    body = json.dumps([{"id": str(i)} for i in range(3)])
+    response = client(REST_BULK_ENABLED=True).post("/api/in/bulk", content=body)
+    assert [json.loads(line)["response"] for line in response.text.splitlines()] == [2, 2, 1]
+
+
+def test_jobs(routes, client, start_adapter):
+    adapter = start_adapter(consume="in", produce="out", WORKER_MODE="thread")
+    client = client(adapter, REST_JOBS_ENABLED=True)
+
+    response = client.post("/api/in/out/jobs", json={"id": "a"})
+    assert response.status_code == 202
+    url = response.json()["url"]
+    assert wait_for(lambda: client.get(url).json()["status"] == "done")
+    assert client.get(url).json()["response"] == {"id": "A"}
+    assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_jobs_return_503_when_the_worker_pool_is_full(client, start_adapter):
+    register_schema("in")
+    release = threading.Event()
+
+    @API.post(consumer="in")
+    def handler(service, message):
+        release.wait()
+
+    adapter = start_adapter(consume="in", WORKER_MODE="thread", WORKER_COUNT=1, WORKER_QUEUE_SIZE=1)
+    client = client(adapter, REST_JOBS_ENABLED=True)
+    assert client.post("/api/in/jobs", json={"id": "a"}).status_code == 202
+    response = client.post("/api/in/jobs", json={"id": "b"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    release.set()
+    assert wait_for(lambda: adapter.jobs.pending == 0)
@@ -0,0 +1,76 @@
+import dataclasses
+import importlib.util
+
+import pytest
+
+from starter_service.avro_parser import TARGETS, avsc_to_code, avsc_to_model, avsc_to_pydantic
+from starter_service.schemas import SchemaRegistry
+
+SCHEMA = {
+    "type": "record",
+    "name": "Message",
+    "fields": [
+        {"name": "id", "type": "string"},
+        {"name": "class", "type": "string", "default": "c"},
+        {"name": "count", "type": ["null", "int"], "default": None},
+        {"name": "tags", "type": {"type": "array", "items": "string"}, "default": []},
+        {"name": "kind", "type": {"type": "enum", "name": "Kind", "symbols": ["A", "B"]}},
+        {"name": "item", "type": {"type": "record", "name": "Item", "fields": [{"name": "n", "type": "long"}]}},
+    ]
+}
+
+
+def load(code):
+    module = {}
+    exec(code, module)
+    return module["main_class"]
+
+
+def test_pydantic_code_is_unchanged():
+    assert avsc_to_code(SCHEMA) == avsc_to_pydantic(SCHEMA)
+    message = load(avsc_to_pydantic(SCHEMA)[0])(id="1", kind="A", item={"n": 1})
+    assert message.dict()["class"] == "c"
+
+
+@pytest.mark.parametrize("build", [lambda: load(avsc_to_code(SCHEMA, "dataclass")[0]),
+                                   lambda: avsc_to_model(SCHEMA, "dataclass")], ids=["code", "model"])
+def test_dataclass_target(build):
+    cls = build()
+    assert dataclasses.is_dataclass(cls) and hasattr(cls, "__slots__")
+    message = cls(id="1", kind="A", item={"n": 1})
+    assert message.dict() == {"id": "1", "class": "c", "count": None, "tags": [], "kind": "A", "item": {"n": 1}}
+    assert message.tags is not cls(id="2", kind="B", item={"n": 2}).tags
+
+
+def test_msgspec_target():
+    msgspec = pytest.importorskip("msgspec")
+    cls = avsc_to_model(SCHEMA, "msgspec")
+    message = msgspec.convert({"id": "1", "kind": "A", "item": {"n": 1}}, cls)
+    assert message.dict()["class"] == "c"
+    assert load(avsc_to_code(SCHEMA, "msgspec")[0]).__name__ == "Message"
+
+
+def test_schema_hash_depends_on_target():
+    hashes = {SchemaRegistry.schema_hash(SCHEMA, target) for target in TARGETS}
+    assert len(hashes) == len(TARGETS)
+
+
+def test_unknown_target():
+    with pytest.raises(ValueError):
+        avsc_to_code(SCHEMA, "attrs")
+    with pytest.raises(ValueError):
+        SchemaRegistry.set_target("topic", "attrs")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("msgspec") is not None, reason="msgspec is installed")
+def test_msgspec_target_without_msgspec():
+    with pytest.raises(ImportError, match=r"\[msgspec\]"):
+        SchemaRegistry.set_target("topic", "msgspec")
+
+
+def test_registry_uses_the_target_of_a_topic():
+    SchemaRegistry.set_target("compact", "dataclass")
+    SchemaRegistry.register_schema(SCHEMA, "compact")
+    SchemaRegistry.register_schema(SCHEMA, "model")
+    assert dataclasses.is_dataclass(SchemaRegistry.get_schema("compact"))
+    assert hasattr(SchemaRegistry.get_schema("model"), "model_fields")
@@ -0,0 +1,118 @@
+import threading
+
+from starter_service.api import API
+from starter_service.backpressure import BackpressureController
+from starter_service.local_kafka import LocalBroker
+from tests.conftest import Service, wait_for
+
+
+class Adapter:
+    """Adapter with the interface the controller uses"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.base_service = Service()
+        self.reasons = set()
+
+    def pause_consuming(self, reason):
+        self.reasons.add(reason)
+
+    def resume_consuming(self, reason):
+        self.reasons.discard(reason)
+
+
+class Consumer:
+    """Consumer with the pause and resume signature of ConsumerManager"""
+    paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+def controller(adapter, **kwargs):
+    options = dict(interval_ms=10, queue_size=10, high_watermark=0.8, low_watermark=0.3, max_latency_ms=100,
+                   resume_ratio=0.5)
+    return BackpressureController(adapter, **{**options, **kwargs})
+
+
+def test_pause_on_queue_depth_and_resume_below_low_watermark():
+    adapter = Adapter()
+    backpressure = controller(adapter)
+    adapter.in_flight = 8
+    assert backpressure.check()[0] == "queue"
+    assert adapter.reasons == {"backpressure"}
+
+    adapter.in_flight = 5
+    backpressure.check()
+    assert adapter.reasons == {"backpressure"}
+
+    adapter.in_flight = 3
+    backpressure.check()
+    assert adapter.reasons == set()
+
+
+def test_pause_on_latency():
+    adapter = Adapter()
+    backpressure = controller(adapter, alpha=1)
+    backpressure.observe(0.5)
+    assert backpressure.check()[0] == "latency"
+    backpressure.observe(0.01)
+    backpressure.check()
+    assert not backpressure.paused
+
+
+def test_pause_when_not_ready():
+    adapter = Adapter()
+    adapter.base_service.ready = lambda: False
+    assert controller(adapter).check()[0] == "ready"
+
+
+def test_adapter_pauses_consumers_until_every_reason_is_resumed(start_adapter):
+    adapter = start_adapter(consume="paused_in")
+    consumer = Consumer()
+    adapter._consumers["other"] = consumer
+
+    adapter.pause_consuming("manual")
+    adapter.pause_consuming("backpressure")
+    assert consumer.paused and adapter.paused
+    adapter.resume_consuming("manual")
+    assert consumer.paused
+    adapter.resume_consuming("backpressure")
+    assert not consumer.paused and not adapter.paused
+
+
+def test_paused_local_consumer_stops_delivering(start_adapter):
+    handled = []
+
+    @API.post(consumer="pause_in")
+    def handler(service, message):
+        handled.append(message)
+
+    adapter = start_adapter(consume="pause_in")
+    adapter.pause_consuming()
+    LocalBroker.publish("pause_in", {"n": 1})
+    assert not wait_for(lambda: handled, timeout=0.3)
+    adapter.resume_consuming()
+    assert wait_for(lambda: handled == [{"n": 1}])
+
+
+def test_worker_pool_full_pauses_consumers(start_adapter):
+    release = threading.Event()
+
+    @API.post(consumer="full_in")
+    def handler(service, message):
+        release.wait()
+
+    adapter = start_adapter(consume="full_in", WORKER_MODE="thread", WORKER_COUNT=1, WORKER_QUEUE_SIZE=2)
+    for i in range(5):
+        LocalBroker.publish("full_in", {"n": i})
+    assert wait_for(lambda: adapter.paused)
+    # The consumer thread keeps running, it does not wait for the pool
+    assert adapter.consumers["full_in"].is_alive()
+    assert adapter.in_flight <= 3
+    release.set()
+    assert wait_for(lambda: LocalBroker.consumers("full_in")[0].processed == 5 and adapter.in_flight == 0)
+    assert not adapter.paused
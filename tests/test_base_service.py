@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from starter_service.api import API
+from starter_service.base_service import StarterService
+from starter_service.env import ENV
+from starter_service.local_kafka import LocalBroker
+
+
+def test_stop_sends_every_response(monkeypatch, tmp_path):
+    for name, value in dict(CONSUME="in", PRODUCE="out", WORKER_MODE="thread", WORKER_COUNT=2, PRODUCER_BUFFERING=True,
+                            PRODUCER_LINGER_MS=60000, PRODUCER_BATCH_SIZE=1000).items():
+        monkeypatch.setattr(ENV, name, value)
+
+    class Service(StarterService):
+        path = str(tmp_path)
+
+        def ready(self):
+            return True
+
+        def health(self):
+            return "OK"
+
+        def kafka_callback(self):
+            pass
+
+        def api_callback(self):
+            pass
+
+        @API.post(consumer="in", producer="out")
+        def handler(self, message):
+            time.sleep(0.05)
+            return {"id": message["id"]}
+
+    service = Service()
+    service.kafka.start()
+    assert service.kafka.consumers_started.wait(5)
+    for i in range(10):
+        LocalBroker.publish("in", {"id": i})
+    while LocalBroker.consumers("in")[0].pending:
+        time.sleep(0.01)
+
+    # Responses of queued messages are produced while Kafka stops, they are still sent
+    with pytest.raises(SystemExit):
+        service.stop()
+    assert not service.kafka.is_alive()
+    assert sorted(message["id"] for message in LocalBroker.produced("out")) == list(range(10))
@@ -0,0 +1,54 @@
+import json
+
+from starter_service.batcher import MessageBatcher, estimate_size
+from tests.conftest import wait_for
+
+
+def test_flush_at_size():
+    batches = []
+    batcher = MessageBatcher(size=3, timeout_ms=10000, flush=batches.append)
+    for i in range(7):
+        batcher.add(i)
+    assert wait_for(lambda: len(batches) == 2)
+    batcher.stop()
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_flush_after_timeout():
+    batches = []
+    batcher = MessageBatcher(size=100, timeout_ms=20, flush=batches.append)
+    batcher.add("a")
+    assert wait_for(lambda: batches == [["a"]], timeout=1)
+    batcher.stop()
+
+
+def test_flush_at_max_bytes():
+    batches = []
+    batcher = MessageBatcher(size=100, timeout_ms=10000, flush=batches.append, max_bytes=10, sizer=len)
+    for message in ["aaaa", "bbbb", "cccc"]:
+        batcher.add(message)
+    batcher.stop()
+    assert batches == [["aaaa", "bbbb"], ["cccc"]]
+
+
+def test_failed_flush_does_not_stop_the_batcher():
+    batches = []
+
+    def flush(messages):
+        if not batches:
+            batches.append(None)
+            raise IOError("broker down")
+        batches.append(messages)
+
+    batcher = MessageBatcher(size=1, timeout_ms=10000, flush=flush)
+    batcher.add(1)
+    batcher.add(2)
+    batcher.stop()
+    assert batches == [None, [2]]
+
+
+def test_estimate_size():
+    message = {"id": "1", "content": "x" * 1000, "tags": ["a", "b"], "count": 3}
+    assert len(json.dumps(message)) <= estimate_size(message) < 2 * len(json.dumps(message))
+    assert estimate_size("abc") == 3
+    assert estimate_size(None) > 0
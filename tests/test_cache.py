@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from starter_service.cache import DedupCache, LRUCache, memoize, message_hash
+from tests.conftest import counter
+
+
+def test_lru_cache_evicts_oldest_and_expires():
+    cache = LRUCache(max_size=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "b" not in cache and "c" in cache
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_lru_cache_max_bytes():
+    cache = LRUCache(max_size=100, max_bytes=10, sizer=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert "a" not in cache and cache.bytes == 8
+    cache.set("d", "x" * 11)
+    assert "d" not in cache
+
+
+def test_message_hash_ignores_key_order():
+    assert message_hash({"a": 1, "b": 2}) == message_hash({"b": 2, "a": 1})
+    assert message_hash({"a": 1}) != message_hash({"a": 2})
+
+
+def test_memoize_hits_and_misses():
+    calls = []
+
+    def handler(service, message):
+        calls.append(message)
+        return {"id": message["id"]}
+
+    wrapper = memoize(handler, max_size=10, ttl=60, max_bytes=0)
+    hits = counter("starter_cache_hits_total", ("handler", "handler"))
+    assert wrapper(None, {"id": 1}) == {"id": 1}
+    assert wrapper(None, {"id": 1}) == {"id": 1}
+    assert wrapper(None, {"id": 2}) == {"id": 2}
+    assert calls == [{"id": 1}, {"id": 2}]
+    assert counter("starter_cache_hits_total", ("handler", "handler")) == hits + 1
+
+
+def test_memoize_does_not_cache_none():
+    calls = []
+
+    def handler(service, message):
+        calls.append(message)
+
+    wrapper = memoize(handler, max_size=10, ttl=60, max_bytes=0)
+    wrapper(None, {"id": 1})
+    wrapper(None, {"id": 1})
+    assert len(calls) == 2 and len(wrapper.cache) == 0
+
+
+def test_memoize_async_handler():
+    calls = []
+
+    async def handler(service, message):
+        calls.append(message)
+        return message["id"]
+
+    wrapper = memoize(handler, max_size=10, ttl=60, max_bytes=0)
+    assert asyncio.run(wrapper(None, {"id": 1})) == 1
+    assert asyncio.run(wrapper(None, {"id": 1})) == 1
+    assert len(calls) == 1
+
+
+def test_memoize_cached_hook():
+    def handler(service, message):
+        raise AssertionError("only called through cached")
+
+    wrapper = memoize(handler, max_size=10, ttl=60, max_bytes=0)
+    calls = []
+    call = lambda message: calls.append(message) or message["id"]
+    assert wrapper.cached({"id": 1}, call) == 1
+    assert wrapper.cached({"id": 1}, call) == 1
+    assert len(calls) == 1
+    assert wrapper.uncached is handler
+
+
+def test_dedup_key_field_and_content_hash():
+    dedup = DedupCache(max_size=10, key_field="id")
+    assert dedup.key({"id": 1, "n": 1}) == dedup.key({"id": 1, "n": 2})
+    assert dedup.key({"n": 1}) == message_hash({"n": 1})
+    key = dedup.key({"id": 1})
+    assert not dedup.seen(key)
+    dedup.add(key)
+    assert dedup.seen(key)
+
+
+def test_dedup_survives_restart(tmp_path):
+    path = str(tmp_path / "dedup" / "keys")
+    dedup = DedupCache(max_size=3, ttl=60, path=path)
+    keys = [dedup.key({"n": i}) for i in range(5)]
+    for key in keys:
+        dedup.add(key)
+    dedup.close()
+
+    dedup = DedupCache(max_size=3, ttl=60, path=path)
+    assert [dedup.seen(key) for key in keys] == [False, False, True, True, True]
+    dedup.close()
+
+    # Another capacity starts over
+    dedup = DedupCache(max_size=4, ttl=60, path=path)
+    assert len(dedup) == 0
+    dedup.close()
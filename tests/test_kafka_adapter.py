@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from starter_service.api import API
+from starter_service.jobs import JobQueueFull
+from starter_service.local_kafka import LocalBroker
+from starter_service.supervisor import Supervisor
+from tests.conftest import counter, wait_for
+
+
+def produced(adapter, topic, count):
+    """Wait until count messages were produced to a topic, returns them"""
+    wait_for(lambda: adapter.flush() or LocalBroker.count(topic) >= count)
+    return LocalBroker.produced(topic)
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "async"])
+def test_responses_are_produced(start_adapter, mode):
+    if mode == "async":
+        @API.post(consumer="in", producer="out")
+        async def handler(service, message):
+            await asyncio.sleep(0)
+            return {"id": message["id"]}
+    else:
+        @API.post(consumer="in", producer="out")
+        def handler(service, message):
+            return {"id": message["id"]}
+
+    adapter = start_adapter(consume="in", produce="out", WORKER_MODE=mode)
+    for i in range(10):
+        LocalBroker.publish("in", {"id": i})
+    assert sorted(m["id"] for m in produced(adapter, "out", 10)) == list(range(10))
+
+
+def test_send_test_message(start_adapter, caplog):
+    adapter = start_adapter(produce="out")
+    with caplog.at_level(logging.INFO):
+        adapter.send_message({"id": 1}, topics="out", testing=True)
+        adapter.logger.info("Kafka logger takes a single message")
+    assert "Sending test message to out" in caplog.text
+    assert "Kafka logger takes a single message" in caplog.text
+    assert LocalBroker.count("out") == 0
+
+
+def test_batch_handler(start_adapter):
+    batches = []
+
+    @API.post(consumer="in", producer="out", batch=True, batch_size=3, batch_timeout_ms=50)
+    def handler(service, messages):
+        batches.append(len(messages))
+        return [{"id": message["id"]} for message in messages]
+
+    adapter = start_adapter(consume="in", produce="out")
+    for i in range(7):
+        LocalBroker.publish("in", {"id": i})
+    assert len(produced(adapter, "out", 7)) == 7
+    assert batches == [3, 3, 1]
+
+
+def test_fanout_gives_every_handler_a_copy(start_adapter):
+    seen = []
+    barrier = threading.Barrier(2, timeout=2)
+
+    @API.post(consumer="in")
+    def first(service, message):
+        barrier.wait()
+        message["handler"] = "first"
+        seen.append(dict(message))
+
+    @API.post(consumer="in")
+    def second(service, message):
+        barrier.wait()
+        seen.append(dict(message))
+
+    start_adapter(consume="in", FANOUT_ENABLED=True)
+    LocalBroker.publish("in", {"id": 1})
+    # Both handlers wait for each other, so they only finish when they run at the same time
+    assert wait_for(lambda: len(seen) == 2)
+    assert {"id": 1} in seen and {"id": 1, "handler": "first"} in seen
+
+
+def test_fanout_executor_is_shared_by_the_worker_lanes(start_adapter):
+    @API.post(consumer="in")
+    def first(service, message):
+        pass
+
+    @API.post(consumer="in")
+    def second(service, message):
+        pass
+
+    adapter = start_adapter(consume="in", FANOUT_ENABLED=True, WORKER_MODE="thread", WORKER_COUNT=4)
+    executor = adapter._fanout_executor
+    for i in range(50):
+        LocalBroker.publish("in", {"id": i})
+    assert wait_for(lambda: LocalBroker.consumers("in")[0].processed == 50 and adapter.in_flight == 0)
+    assert adapter._fanout_executor is executor
+    assert len([t for t in threading.enumerate() if t.name.startswith("FanOut")]) <= 8
+
+
+def test_dedup_skips_replayed_messages(start_adapter):
+    handled = []
+
+    @API.post(consumer="in")
+    def handler(service, message):
+        handled.append(message["id"])
+
+    start_adapter(consume="in", DEDUP_ENABLED=True, DEDUP_KEY="id")
+    skipped = counter("starter_messages_deduplicated_total", ("topic", "in"))
+    for i in [1, 2, 1, 3, 2]:
+        LocalBroker.publish("in", {"id": i})
+    assert wait_for(lambda: LocalBroker.consumers("in")[0].processed == 5)
+    assert handled == [1, 2, 3]
+    assert counter("starter_messages_deduplicated_total", ("topic", "in")) == skipped + 2
+
+
+def test_failed_messages_are_not_marked_processed(start_adapter):
+    calls = []
+
+    @API.post(consumer="in")
+    def handler(service, message):
+        calls.append(message)
+        if len(calls) == 1:
+            raise ValueError("first call fails")
+
+    start_adapter(consume="in", DEDUP_ENABLED=True)
+    LocalBroker.publish("in", {"id": 1})
+    LocalBroker.publish("in", {"id": 1})
+    LocalBroker.publish("in", {"id": 1})
+    assert wait_for(lambda: LocalBroker.consumers("in")[0].processed == 3)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("worker_index, suffix", [(None, ""), (2, ".2")])
+def test_dedup_file_is_opened_per_worker(start_adapter, monkeypatch, tmp_path, worker_index, suffix):
+    monkeypatch.setattr(Supervisor, "worker_index", worker_index)
+    path = tmp_path / "dedup"
+    adapter = start_adapter(consume="in", DEDUP_ENABLED=True, DEDUP_PATH=str(path))
+    assert adapter._dedup.path == f"{path}{suffix}"
+    assert (tmp_path / f"dedup{suffix}").exists()
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "async"])
+def test_jobs(start_adapter, mode):
+    @API.post(consumer="in", producer="out")
+    def handler(service, message):
+        if message.get("fail"):
+            raise ValueError("boom")
+        return {"id": message["id"]}
+
+    adapter = start_adapter(consume="in", produce="out", WORKER_MODE=mode)
+    route = API.functions[0]
+    done = adapter.submit_job(route, {"id": 1})
+    failed = adapter.submit_job(route, {"fail": True})
+    assert wait_for(lambda: adapter.jobs.get(done)["status"] == "done")
+    assert adapter.jobs.get(done)["response"] == {"id": 1}
+    assert wait_for(lambda: adapter.jobs.get(failed)["status"] == "failed")
+    assert "boom" in adapter.jobs.get(failed)["error"]
+    assert produced(adapter, "out", 1) == [{"id": 1}]
+    assert adapter.jobs.pending == 0
+
+
+def test_job_rejected_when_worker_pool_is_full(start_adapter):
+    release = threading.Event()
+
+    @API.post(consumer="in")
+    def handler(service, message):
+        release.wait()
+
+    adapter = start_adapter(consume="in", WORKER_MODE="thread", WORKER_COUNT=1, WORKER_QUEUE_SIZE=2)
+    route = API.functions[0]
+    adapter.submit_job(route, {})
+    adapter.submit_job(route, {})
+    with pytest.raises(JobQueueFull):
+        adapter.submit_job(route, {})
+    assert adapter.jobs.pending == 2
+    release.set()
+    assert wait_for(lambda: adapter.jobs.pending == 0)
+
+
+def test_job_on_stopped_worker_pool_releases_pending(start_adapter):
+    @API.post(consumer="in")
+    def handler(service, message):
+        pass
+
+    adapter = start_adapter(consume="in", WORKER_MODE="thread")
+    adapter._worker_pool.stop()
+    with pytest.raises(RuntimeError):
+        adapter.submit_job(API.functions[0], {})
+    assert adapter.jobs.pending == 0
+
+
+def test_consumer_death_stops_the_adapter(start_adapter):
+    @API.post(consumer="in")
+    def handler(service, message):
+        pass
+
+    adapter = start_adapter(consume="in")
+    adapter.consumers["in"].running = False
+    adapter.join(5)
+    assert not adapter.is_alive()
+    assert not adapter.running
+
+
+def test_consuming_continues_when_a_schema_can_not_be_registered(start_adapter):
+    handled = []
+
+    @API.post(consumer="in")
+    def handler(service, message):
+        handled.append(message)
+
+    LocalBroker.register_schema("in", {"type": "record", "name": "In", "fields": [{"name": "data", "type": "bytes"}]})
+    adapter = start_adapter(consume="in")
+    assert "Could not register schema of consumer for topic in" in adapter.error_msg
+    LocalBroker.publish("in", {"data": "x"})
+    assert wait_for(lambda: handled == [{"data": "x"}])
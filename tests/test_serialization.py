@@ -0,0 +1,53 @@
+import importlib
+import json
+import sys
+import types
+
+import pytest
+from pydantic import BaseModel
+
+from starter_service import serialization
+from starter_service.env import ENV
+
+
+class Model(BaseModel):
+    id: str
+
+
+@pytest.mark.parametrize("name", [engine for engine in serialization.ENGINES if engine != "auto"])
+def test_installed_engines(name):
+    if name != "json":
+        pytest.importorskip(name)
+    engine, dumps = serialization.load_engine(name)
+    assert engine == name
+    value = {"id": "ü", "items": [1, 2.5, None, True], "model": Model(id="1")}
+    assert json.loads(dumps(value)) == {"id": "ü", "items": [1, 2.5, None, True], "model": {"id": "1"}}
+
+
+def test_missing_engine_raises(monkeypatch):
+    monkeypatch.setitem(sys.modules, "msgspec", None)
+    with pytest.raises(ImportError, match=r"\[msgspec\]"):
+        serialization.load_engine("msgspec")
+
+
+def test_import_with_an_encoder_method(monkeypatch):
+    """msgspec returns the encode method of an Encoder, the module has to load with such a dumps"""
+
+    class Encoder:
+        def __init__(self, enc_hook=None):
+            self.enc_hook = enc_hook
+
+        def encode(self, value):
+            return json.dumps(value, default=self.enc_hook).encode()
+
+    msgspec = types.ModuleType("msgspec")
+    msgspec.json = types.SimpleNamespace(Encoder=Encoder)
+    monkeypatch.setitem(sys.modules, "msgspec", msgspec)
+    monkeypatch.setattr(ENV, "SERIALIZER", "msgspec")
+    try:
+        module = importlib.reload(serialization)
+        assert module.engine == "msgspec"
+        assert module.dumps({"id": 1}) == b'{"id": 1}'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(serialization)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from starter_service.worker_pool import WorkerPool, WorkerPoolFull
+from tests.conftest import wait_for
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def create(**kwargs):
+        worker_pool = WorkerPool(**kwargs)
+        worker_pool.start()
+        pools.append(worker_pool)
+        return worker_pool
+
+    yield create
+    for worker_pool in pools:
+        if worker_pool.running:
+            worker_pool.stop()
+
+
+def test_submit_does_not_block_when_full(pool):
+    events = []
+    release = threading.Event()
+    worker_pool = pool(workers=1, queue_size=2, on_full=lambda: events.append("full"),
+                       on_drain=lambda: events.append("drain"))
+
+    start = time.monotonic()
+    for _ in range(5):
+        worker_pool.submit(None, release.wait)
+    assert time.monotonic() - start < 0.5
+    assert worker_pool.in_flight == 5
+    assert events == ["full"]
+
+    release.set()
+    assert wait_for(lambda: worker_pool.in_flight == 0)
+    assert events == ["full", "drain"]
+
+
+def test_reject_when_full(pool):
+    release = threading.Event()
+    worker_pool = pool(workers=1, queue_size=1)
+    worker_pool.submit(None, release.wait)
+    with pytest.raises(WorkerPoolFull):
+        worker_pool.submit(None, release.wait, reject=True)
+    assert worker_pool.in_flight == 1
+    release.set()
+
+
+def test_submit_to_stopped_pool(pool):
+    worker_pool = pool(workers=1)
+    worker_pool.stop()
+    with pytest.raises(RuntimeError):
+        worker_pool.submit(None, print)
+    assert worker_pool.in_flight == 0
+
+
+def test_same_key_keeps_order(pool):
+    worker_pool = pool(workers=4, queue_size=100)
+    handled = {"a": [], "b": []}
+    for i in range(50):
+        key = "a" if i % 2 else "b"
+        worker_pool.submit(key, lambda k, n: (time.sleep(0.001), handled[k].append(n)), key, i)
+    assert wait_for(lambda: worker_pool.in_flight == 0)
+    assert handled["a"] == sorted(handled["a"]) and len(handled["a"]) == 25
+    assert handled["b"] == sorted(handled["b"]) and len(handled["b"]) == 25
+
+
+def test_async_mode_waits_concurrently(pool):
+    worker_pool = pool(mode="async", workers=1, queue_size=100)
+    done = []
+
+    async def task(n):
+        await asyncio.sleep(0.2)
+        done.append(n)
+
+    start = time.monotonic()
+    for i in range(20):
+        worker_pool.submit(None, task, i)
+    assert wait_for(lambda: len(done) == 20)
+    assert time.monotonic() - start < 2
+
+
+def test_execute_calls_async_handlers(pool):
+    worker_pool = pool(workers=1, service="service")
+
+    async def handler(service, message):
+        return service, message
+
+    assert worker_pool.execute(handler, 1) == ("service", 1)
+
+
+def double(service, message):
+    time.sleep(0.01)
+    return message * 2
+
+
+@pytest.mark.parametrize("mode", WorkerPool.MODES)
+def test_stop_runs_every_queued_task(pool, mode):
+    worker_pool = pool(mode=mode, workers=2, queue_size=100)
+    done = []
+
+    if mode == "async":
+        async def task(n):
+            done.append(await worker_pool.execute_async(double, n))
+    else:
+        def task(n):
+            done.append(worker_pool.execute(double, n))
+
+    for i in range(20):
+        worker_pool.submit(None, task, i)
+    worker_pool.stop()
+    assert sorted(done) == [i * 2 for i in range(20)]
+    assert worker_pool.in_flight == 0